@@ -1,38 +1,62 @@
-from flask import Flask, render_template, Response
+from flask import Flask, render_template, Response, request, jsonify
+from markupsafe import escape
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from collections import deque
+import json
 import logging
 import threading
-import time
 import os
 
 app = Flask(__name__)
 
 # Adjust the paths
-text_file_path = os.path.join('..', 'supertranscription', 'summary.txt')
+feed_file_path = os.path.join('..', 'supertranscription', 'display_feed.jsonl')
 fixed_text_file_path = "fixed_text.txt"
-latest_text = ""
 fixed_text = ""
 
+# Events from the feed (see supertranscription/displayfeed.py), in order. Each
+# /stream client keeps its own cursor into them and is woken through the
+# condition as soon as new ones are read, instead of polling.
+events = []
+notes = []
+feed_generation = 0  # Bumped when the feed is truncated for a new visit
+condition = threading.Condition()
+
 # Track the last read position
 last_read_position = 0
 
+# Time to first visible token, as reported by the browsers
+first_token_latencies = deque(maxlen=1000)
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
-def read_text_file():
-    global latest_text, last_read_position
+def read_feed_file():
+    global notes, last_read_position, feed_generation
     try:
-        with open(text_file_path, "r") as file:
-            # Move the file pointer to the last read position
-            file.seek(last_read_position)
-            new_content = file.read()
-            if new_content:
-                latest_text += new_content.replace("\n", "<br>")
-                last_read_position = file.tell()
-                logging.info(f'Latest text updated: {latest_text}')
+        with condition:
+            if os.path.getsize(feed_file_path) < last_read_position:
+                # The processor started a new visit
+                events.clear()
+                notes = []
+                last_read_position = 0
+                feed_generation += 1
+            with open(feed_file_path, "rb") as file:
+                file.seek(last_read_position)
+                new_content = file.read()
+            # Only whole lines; a partly written event is read next time
+            complete = new_content[:new_content.rfind(b"\n") + 1]
+            last_read_position += len(complete)
+            for line in complete.decode("utf-8").splitlines():
+                event = json.loads(line)
+                events.append(event)
+                if event["type"] == "notes":
+                    notes = event["notes"]
+            if complete:
+                condition.notify_all()
     except Exception as e:
-        logging.error(f'Error reading {text_file_path}: {e}')
+        logging.error(f'Error reading {feed_file_path}: {e}')
 
 def read_fixed_text_file():
     global fixed_text
@@ -43,39 +67,73 @@ def read_fixed_text_file():
     except Exception as e:
         logging.error(f'Error reading {fixed_text_file_path}: {e}')
 
-class TextFileHandler(FileSystemEventHandler):
+class FeedFileHandler(FileSystemEventHandler):
     def on_modified(self, event):
-        if event.src_path.endswith('summary.txt'):
-            logging.info(f'{text_file_path} has been modified.')
-            read_text_file()
+        if event.src_path.endswith('display_feed.jsonl'):
+            read_feed_file()
+
+    on_created = on_modified
+
+def summarize_latencies(seconds):
+    ms = sorted(1000 * s for s in seconds)
+    if not ms:
+        return {"count": 0}
+    def percentile(p):
+        return round(ms[min(len(ms) - 1, int(p * len(ms)))], 1)
+    return {"count": len(ms), "p50_ms": percentile(0.5), "p95_ms": percentile(0.95), "max_ms": round(ms[-1], 1)}
 
 @app.route('/')
 def index():
     global fixed_text  # Ensure fixed_text is updated before rendering
     read_fixed_text_file()
-    return render_template('index.html', initial_text=latest_text, fixed_text=fixed_text)
+    with condition:
+        initial_text = "".join(f"<div>• {escape(note)}</div>" for note in notes)
+    return render_template('index.html', initial_text=initial_text, fixed_text=fixed_text)
 
 @app.route('/stream')
 def stream():
     def generate():
-        global latest_text
+        with condition:
+            cursor, generation = len(events), feed_generation
+            current = list(notes)
+        yield f"event: notes\ndata: {json.dumps({'type': 'notes', 'notes': current})}\n\n"
         while True:
-            time.sleep(1)
-            if latest_text:
-                yield f"data: {latest_text}\n\n"
-                latest_text = ""
-    return Response(generate(), mimetype='text/event-stream')
+            with condition:
+                condition.wait_for(lambda: len(events) > cursor or feed_generation != generation, timeout=15)
+                if feed_generation != generation:
+                    cursor, generation = 0, feed_generation
+                new_events = events[cursor:]
+                cursor = len(events)
+            if not new_events:
+                yield ": keep-alive\n\n"
+            for event in new_events:
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    return Response(generate(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache"})
+
+@app.route('/first-token', methods=['POST', 'GET'])
+def first_token():
+    # The page posts, for the first token of each note it shows, the seconds from
+    # the end of speech and from the summarization request to it being on screen
+    if request.method == 'POST':
+        report = request.get_json(force=True)
+        first_token_latencies.append(report)
+        logging.info(f"First visible token: {report}")
+        return "", 204
+    reports = list(first_token_latencies)
+    return jsonify({key: summarize_latencies([r[key] for r in reports if r.get(key) is not None])
+                    for key in ("speech_to_visible_s", "request_to_visible_s")})
 
 if __name__ == "__main__":
-    # Read the initial and fixed texts
-    read_text_file()
+    # Read the current feed and the fixed text
+    if os.path.exists(feed_file_path):
+        read_feed_file()
     read_fixed_text_file()
 
     # Set up the observer
-    event_handler = TextFileHandler()
+    event_handler = FeedFileHandler()
     observer = Observer()
-    # Use the directory of the text_file_path
-    observer.schedule(event_handler, path=os.path.dirname(text_file_path), recursive=False)
+    # Use the directory of the feed_file_path
+    observer.schedule(event_handler, path=os.path.dirname(feed_file_path), recursive=False)
     observer_thread = threading.Thread(target=observer.start)
     observer_thread.start()
 
@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+
+# Part of every embedding cache key; bump it whenever align_faces produces
+# different crops so stale cached embeddings are never reused
+PREPROCESS_VERSION = "affine-160-v1"
+
+class AlignedFaceBuffer:
+    def __init__(self, capacity=8, size=160):
+        self.size = size
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        self.pixels = np.empty((capacity, self.size, self.size, 3), dtype=np.uint8)
+        self.faces = np.empty((capacity, self.size, self.size, 3), dtype=np.float32)
+
+    def reserve(self, count):
+        if count > len(self.faces):
+            self.allocate(max(count, 2 * len(self.faces)))
+
+def to_model_input(pixels, out=None):
+    # BGR uint8 crops -> RGB float32 in [0, 1], as Facenet takes them
+    if out is None:
+        out = np.empty(pixels.shape, dtype=np.float32)
+    np.multiply(pixels[..., ::-1], 1 / 255.0, out=out, casting='unsafe')
+    return out
+
+def align_faces(frame, faces, buffer):
+    # Aligns every face in one pass: each face gets a single affine warp that
+    # rotates about the eye center, crops the box and scales to 160x160, and
+    # lands in a reusable buffer. Returns the indices of the faces that were
+    # aligned and an (N, 160, 160, 3) float32 RGB view into the buffer.
+    kept = [i for i, face in enumerate(faces)
+            if face['box'][2] > 0 and face['box'][3] > 0
+            and 'left_eye' in face['keypoints'] and 'right_eye' in face['keypoints']]
+    if not kept:
+        return kept, buffer.faces[:0]
+    buffer.reserve(len(kept))
+
+    boxes = np.array([faces[i]['box'] for i in kept], dtype=np.float64)
+    left_eyes = np.array([faces[i]['keypoints']['left_eye'] for i in kept], dtype=np.float64)
+    right_eyes = np.array([faces[i]['keypoints']['right_eye'] for i in kept], dtype=np.float64)
+
+    # Same rotation as cv2.getRotationMatrix2D(eye_center, angle, 1.0), with
+    # the crop offset and resize folded into the same matrix
+    dx, dy = (right_eyes - left_eyes).T
+    angles = np.arctan2(dy, dx)
+    cos, sin = np.cos(angles), np.sin(angles)
+    cx, cy = ((left_eyes + right_eyes) / 2).T
+    sx = buffer.size / boxes[:, 2]
+    sy = buffer.size / boxes[:, 3]
+    matrices = np.empty((len(kept), 2, 3))
+    matrices[:, 0, 0] = sx * cos
+    matrices[:, 0, 1] = sx * sin
+    matrices[:, 0, 2] = sx * ((1 - cos) * cx - sin * cy - boxes[:, 0])
+    matrices[:, 1, 0] = -sy * sin
+    matrices[:, 1, 1] = sy * cos
+    matrices[:, 1, 2] = sy * (sin * cx + (1 - cos) * cy - boxes[:, 1])
+
+    for i, matrix in enumerate(matrices):
+        cv2.warpAffine(frame, matrix, (buffer.size, buffer.size), dst=buffer.pixels[i])
+    # BGR -> RGB and scaling to [0, 1] for the whole batch in one pass
+    return kept, to_model_input(buffer.pixels[:len(kept)], out=buffer.faces[:len(kept)])
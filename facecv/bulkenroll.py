@@ -0,0 +1,233 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from alignment import AlignedFaceBuffer, align_faces, to_model_input
+
+# Enrolls a whole photo collection in one run.
+#   python bulkenroll.py photos/                 photos/<person name>/<image>
+#   python bulkenroll.py manifest.csv            CSV with "path" and "name" columns
+# Images are decoded, detected and aligned in a process pool and embedded in
+# batches. At most --window images are in flight or waiting to be embedded,
+# and workers hand back uint8 crops, so memory stays flat however large the
+# collection is. Embeddings are committed to FaceDatabaseManager with one store
+# append per --commit-every images (0 commits everything at the end). Every
+# committed record stores its image path, and every image rejected by
+# detection is logged to <db>.rejected.jsonl, so rerunning after a crash skips
+# both (--retry-rejected runs the rejected ones again, e.g. with a new
+# --min-confidence). An image that raises in a worker is counted as an error
+# and retried on the next run; it does not stop this one.
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+detector = None
+face_buffer = None
+
+def read_manifest(source):
+    if os.path.isdir(source):
+        items = []
+        for name in sorted(os.listdir(source)):
+            person_dir = os.path.join(source, name)
+            if not os.path.isdir(person_dir):
+                continue
+            for filename in sorted(os.listdir(person_dir)):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    items.append((os.path.abspath(os.path.join(person_dir, filename)), name))
+        return items
+    with open(source, newline="", encoding="utf-8") as f:
+        base_dir = os.path.dirname(os.path.abspath(source))
+        return [(os.path.abspath(os.path.join(base_dir, row["path"])), row["name"]) for row in csv.DictReader(f)]
+
+def init_worker():
+    global detector, face_buffer
+    from mtcnn import MTCNN
+    detector = MTCNN()
+    face_buffer = AlignedFaceBuffer(capacity=1)
+
+def detect_and_align(item, min_confidence):
+    # Runs in a worker process; returns (path, name, 160x160 BGR uint8 crop or None,
+    # reject reason, error). uint8 is a quarter of the float32 model input, which is
+    # built in the main process. Exceptions come back as error instead of raising.
+    path, name = item
+    try:
+        pixels, reason = align_largest_face(path, min_confidence)
+    except Exception as e:
+        return path, name, None, None, repr(e)
+    return path, name, pixels, reason, None
+
+def align_largest_face(path, min_confidence):
+    frame = cv2.imread(path)
+    if frame is None:
+        return None, "unreadable image"
+    faces = detector.detect_faces(frame)
+    if not faces:
+        return None, "no face detected"
+    # Enrollment photos are expected to show one person; use the largest face
+    face = max(faces, key=lambda face: face['box'][2] * face['box'][3])
+    if face['confidence'] < min_confidence:
+        return None, f"low detection confidence {face['confidence']:.2f}"
+    kept, _ = align_faces(frame, [face], face_buffer)
+    if not kept:
+        return None, "alignment failed"
+    return face_buffer.pixels[0].copy(), None
+
+def read_rejected(path):
+    # Image paths already rejected by detection in earlier runs
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    # The last element is either empty or a partially written line
+    return {json.loads(line)["path"] for line in lines[:-1]}
+
+def bounded_map(pool, fn, items, window, *args):
+    # Like pool.map, in order, but with at most window tasks submitted and not
+    # yet consumed, instead of submitting everything up front
+    futures = deque()
+    for item in items:
+        if len(futures) >= window:
+            yield futures.popleft().result()
+        futures.append(pool.submit(fn, item, *args))
+    while futures:
+        yield futures.popleft().result()
+
+class Enrollment:
+    def __init__(self, db_manager, recognizer, commit_every, rejected_path):
+        self.db_manager = db_manager
+        self.recognizer = recognizer
+        self.commit_every = commit_every
+        self.vectors, self.names, self.paths = [], [], []
+        self.rejected = []
+        self.errors = []
+        self.rejected_file = open(rejected_path, "a", encoding="utf-8")
+
+    def reject(self, path, reason):
+        # Logged right away, so a resumed run does not detect this image again
+        self.rejected.append((path, reason))
+        self.rejected_file.write(json.dumps({"path": path, "reason": reason}) + "\n")
+        self.rejected_file.flush()
+
+    def error(self, path, error):
+        # Not logged: the image is tried again on the next run
+        self.errors.append((path, f"error: {error}"))
+        self.enrolled = 0
+        self.embed_seconds = 0.0
+        self.embedded = 0
+
+    def embed(self, pending):
+        start = time.perf_counter()
+        face_vectors = self.recognizer.vectorize_faces(to_model_input(np.stack([pixels for _, _, pixels in pending])))
+        self.embed_seconds += time.perf_counter() - start
+        if face_vectors is None:
+            self.errors.extend((path, "error: embedding failed") for path, _, _ in pending)
+            return
+        self.embedded += len(pending)
+        self.vectors.append(face_vectors)
+        self.names.extend(name for _, name, _ in pending)
+        self.paths.extend(path for path, _, _ in pending)
+        if self.commit_every and len(self.names) >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        # One append for the whole batch, so a crash never leaves half of it behind
+        if not self.names:
+            return
+        self.db_manager.add_faces(np.concatenate(self.vectors), self.names, self.paths)
+        self.enrolled += len(self.names)
+        self.vectors, self.names, self.paths = [], [], []
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-enroll face photos into the face database.")
+    parser.add_argument("source", help="Directory of <name>/<image> folders, or a CSV manifest with path,name columns")
+    parser.add_argument("--db", default="face_recognition.db")
+    parser.add_argument("--mode", default="centroid", choices=["centroid", "exemplar"])
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--batch-size", type=int, default=64, help="Faces per embedding batch")
+    parser.add_argument("--commit-every", type=int, default=512,
+                        help="Images per database commit; 0 commits everything in one transaction at the end")
+    parser.add_argument("--window", type=int, default=0,
+                        help="Images in flight at once (default: 4 per worker, at least one embedding batch)")
+    parser.add_argument("--min-confidence", type=float, default=0.9)
+    parser.add_argument("--retry-rejected", action="store_true",
+                        help="Process images rejected in earlier runs again instead of skipping them")
+    parser.add_argument("--cache", default="embedding_cache.sqlite",
+                        help="Embedding cache file, so re-enrolling the same photos skips Facenet; empty to disable")
+    parser.add_argument("--cache-size", type=int, default=200_000, help="Maximum cached embeddings")
+    parser.add_argument("--rejects", default="rejected.csv", help="Where to write the rejected images report")
+    args = parser.parse_args()
+
+    # Heavy imports stay out of module scope so spawned workers only load MTCNN
+    from facedatamanager import FaceDatabaseManager
+    from detection import FaceRecognizer
+    from embeddingcache import EmbeddingCache
+    from alignment import PREPROCESS_VERSION
+
+    db_manager = FaceDatabaseManager(db_path=args.db, mode=args.mode)
+    cache = None
+    if args.cache:
+        cache = EmbeddingCache(args.cache, model_name="Facenet", preprocess_version=PREPROCESS_VERSION,
+                               max_entries=args.cache_size)
+    recognizer = FaceRecognizer(db_manager, batch_size=args.batch_size, embedding_cache=cache)
+    recognizer.load_embedding_model()  # Detection runs in the workers; only Facenet is needed here
+    rejected_path = os.path.splitext(args.db)[0] + ".rejected.jsonl"
+    if args.retry_rejected and os.path.exists(rejected_path):
+        os.remove(rejected_path)
+    previously_rejected = read_rejected(rejected_path)
+    enrollment = Enrollment(db_manager, recognizer, args.commit_every, rejected_path)
+
+    items = read_manifest(args.source)
+    todo = [(path, name) for path, name in items
+            if path not in db_manager.store.sources and path not in previously_rejected]
+    skipped = sum(path in previously_rejected and path not in db_manager.store.sources for path, _ in items)
+    print(f"{len(items)} images listed, {len(items) - len(todo) - skipped} already enrolled, "
+          f"{skipped} rejected before, {len(todo)} to process.")
+
+    pending = []
+    start = time.perf_counter()
+    context = multiprocessing.get_context("spawn")  # TensorFlow does not survive fork
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context, initializer=init_worker) as pool:
+        window = args.window or max(4 * args.workers, args.batch_size)
+        results = bounded_map(pool, detect_and_align, todo, window, args.min_confidence)
+        for done, (path, name, pixels, reason, error) in enumerate(results, 1):
+            if error is not None:
+                enrollment.error(path, error)
+            elif pixels is None:
+                enrollment.reject(path, reason)
+            else:
+                pending.append((path, name, pixels))
+            if len(pending) >= args.batch_size:
+                enrollment.embed(pending)
+                pending = []
+            if done % 100 == 0:
+                elapsed = time.perf_counter() - start
+                print(f"Processed {done}/{len(todo)} images ({done / elapsed:.1f} images/sec).")
+    if pending:
+        enrollment.embed(pending)
+    enrollment.commit()
+    db_manager.save_database()
+    elapsed = time.perf_counter() - start
+
+    enrollment.rejected_file.close()
+    rejected = enrollment.rejected + enrollment.errors
+    print(f"Enrolled {enrollment.enrolled} images in {elapsed:.1f}s ({len(todo) / max(elapsed, 1e-9):.1f} images/sec overall, "
+          f"{enrollment.embedded / max(enrollment.embed_seconds, 1e-9):.1f} images/sec embedding).")
+    if cache is not None:
+        print(f"Embedding cache: {cache.hits} hits, {cache.misses} misses, {len(cache)} entries.")
+        cache.close()
+    print(f"Rejected {len(enrollment.rejected)} images, {len(enrollment.errors)} failed with errors "
+          f"(tried again on the next run).")
+    if rejected:
+        with open(args.rejects, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["path", "reason"])
+            writer.writerows(rejected)
+        print(f"Rejected and failed images written to {args.rejects}.")
+
+if __name__ == "__main__":
+    main()
@@ -1,138 +1,164 @@
+import threading
+import time
 import cv2
-from deepface import DeepFace
 import numpy as np
-import time
-from sklearn.preprocessing import normalize
-from mtcnn import MTCNN
-from PIL import Image
+from pipeline import RecognitionPipeline
+from tracker import FaceTracker
+from facedetector import AdaptiveFaceDetector
+from alignment import AlignedFaceBuffer, align_faces
 
 class FaceRecognizer:
-    def __init__(self, db_manager):
-        self.detector = MTCNN()
+    def __init__(self, db_manager, batch_size=32, reverify_every=30,
+                 detect_scale=1.0, detect_every=1, motion_threshold=None, min_detect_confidence=0.9,
+                 embedding_cache=None, enrollment_queue=None):
+        # MTCNN and Facenet pull in TensorFlow, so they are only imported and
+        # built by warmup() or on first use
+        self.detector = None
+        self.embedding_model = None
+        self.model_lock = threading.Lock()
+        self.startup_timings = {}
+        self.face_detector = AdaptiveFaceDetector(None, scale=detect_scale, detect_every=detect_every,
+                                                  motion_threshold=motion_threshold,
+                                                  min_confidence=min_detect_confidence)
         self.db_manager = db_manager
-        self.recent_faces = {}
+        self.tracker = FaceTracker(reverify_every=reverify_every)
+        self.batch_size = batch_size
+        self.face_buffer = AlignedFaceBuffer()
+        # Optional embeddingcache.EmbeddingCache; worth it when the same photos
+        # are embedded repeatedly (enrollment, gallery rebuilds), not for live video
+        self.embedding_cache = embedding_cache
+        # Optional enrollmentqueue.UnknownFaceQueue that buffers unrecognized
+        # faces for labeling outside the video loop
+        self.enrollment_queue = enrollment_queue
 
-    def capture_and_recognize(self):
-        cap = cv2.VideoCapture(0)
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame = cv2.flip(frame, 1)
-            faces = self.detector.detect_faces(frame)
-            print(f"Detected {len(faces)} face(s).")
-            
-            for face in faces:
-                x, y, w, h = face['box']
-                face_img = frame[y:y+h, x:x+w]
-                face_img = self.preprocess_face(face_img, face['keypoints'])
-                if face_img is None:
-                    continue  # Skip to the next face if preprocessing failed
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-                
-                face_vector = self.vectorize_face(face_img)
-                
-                if face_vector is not None:
-                    face_vector = normalize(face_vector.reshape(1, -1)).flatten()
-                    result, distance = self.db_manager.search_face(face_vector)
-                    
-                    print(f"Recognition result: {result}, Distance: {distance}")
-                    
-                    if result and distance < 0.3:  # Even stricter threshold
-                        name = result
-                        cv2.putText(frame, name, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (36,255,12), 2)
-                        self.recent_faces[face_vector.tobytes()] = time.time()
-                    else:
-                        if face_vector.tobytes() not in self.recent_faces or time.time() - self.recent_faces[face_vector.tobytes()] > 5:
-                            name = input("New face detected. Enter name: ")
-                            num_images = int(input("Enter number of images to capture: "))
-                            self.add_multiple_images(name, num_images)
-                            cv2.putText(frame, "New face added", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (36,255,12), 2)
-                            self.recent_faces[face_vector.tobytes()] = time.time()
-                else:
-                    print("Failed to vectorize face.")
-            
-            cv2.imshow('Face Recognition', frame)
-            
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-        
-        cap.release()
-        cv2.destroyAllWindows()
+    def load_detector(self):
+        with self.model_lock:
+            if self.detector is not None:
+                return
+            start = time.perf_counter()
+            from mtcnn import MTCNN  # Also the first TensorFlow import
+            imported = time.perf_counter()
+            self.detector = MTCNN()
+            self.face_detector.detector = self.detector
+            self.startup_timings["import_mtcnn"] = imported - start
+            self.startup_timings["build_mtcnn"] = time.perf_counter() - imported
 
-    def add_multiple_images(self, name, num_images):
-        cap = cv2.VideoCapture(0)
-        collected_images = 0
-        while collected_images < num_images:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame = cv2.flip(frame, 1)
-            faces = self.detector.detect_faces(frame)
-            print(f"Detected {len(faces)} face(s).")
-            
-            for face in faces:
-                x, y, w, h = face['box']
-                face_img = frame[y:y+h, x:x+w]
-                face_img = self.preprocess_face(face_img, face['keypoints'])
-                if face_img is None:
-                    continue  # Skip to the next face if preprocessing failed
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-                
-                face_vector = self.vectorize_face(face_img)
-                
-                if face_vector is not None:
-                    face_vector = normalize(face_vector.reshape(1, -1)).flatten()
-                    self.db_manager.add_face(face_vector, name)
-                    collected_images += 1
-                    print(f"Collected {collected_images}/{num_images} images for {name}.")
-                else:
-                    print("Failed to vectorize face.")
-            
-            cv2.imshow('Face Capture', frame)
-            
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-        
-        cap.release()
-        cv2.destroyAllWindows()
+    def load_embedding_model(self):
+        with self.model_lock:
+            if self.embedding_model is not None:
+                return
+            start = time.perf_counter()
+            from deepface import DeepFace
+            imported = time.perf_counter()
+            # Build Facenet once and call it directly so a whole frame of faces is
+            # embedded in one forward pass instead of one DeepFace.represent per face
+            facenet = DeepFace.build_model("Facenet")
+            self.embedding_model = getattr(facenet, "model", facenet)
+            self.startup_timings["import_deepface"] = imported - start
+            self.startup_timings["build_facenet"] = time.perf_counter() - imported
 
-    def preprocess_face(self, face_img, keypoints):
-        try:
-            left_eye = keypoints['left_eye']
-            right_eye = keypoints['right_eye']
+    def warmup(self, frame_size=(480, 640)):
+        # Loads both models and runs one dummy inference through each, so the
+        # first real frame does not pay for graph building. Returns seconds per phase.
+        self.load_detector()
+        self.load_embedding_model()
+        start = time.perf_counter()
+        self.detector.detect_faces(np.zeros(frame_size + (3,), dtype=np.uint8))
+        detected = time.perf_counter()
+        self.embed_batch(np.zeros((1, 160, 160, 3), dtype=np.float32))
+        self.startup_timings["warmup_mtcnn"] = detected - start
+        self.startup_timings["warmup_facenet"] = time.perf_counter() - detected
+        return dict(self.startup_timings)
 
-            left_eye_center = np.array([left_eye[0], left_eye[1]], dtype=np.float32)
-            right_eye_center = np.array([right_eye[0], right_eye[1]], dtype=np.float32)
+    def capture_and_recognize(self, source=0, embed_workers=2):
+        # Capture, detection, embedding and rendering run as separate stages so
+        # a slow embedding step drops stale frames instead of building up lag
+        pipeline = RecognitionPipeline(self, source=source, embed_workers=embed_workers)
+        pipeline.run()
 
-            dy = right_eye_center[1] - left_eye_center[1]
-            dx = right_eye_center[0] - left_eye_center[0]
-            angle = np.degrees(np.arctan2(dy, dx))
+    def detect_faces(self, frame):
+        if self.detector is None:
+            self.load_detector()
+        return self.face_detector.detect_faces(frame)
 
-            eye_center = (int((left_eye_center[0] + right_eye_center[0]) // 2),
-                          int((left_eye_center[1] + right_eye_center[1]) // 2))
+    def track_faces(self, frame, faces, buffer=None):
+        # Faces are only aligned and embedded when their track is new or due for
+        # re-verification; every other frame reuses the identity cached on the track
+        tracks = self.tracker.update(faces)
+        pending = [i for i, track in enumerate(tracks) if self.tracker.needs_embedding(track)]
+        kept, face_imgs = self.preprocess_faces(frame, [faces[i] for i in pending], buffer)
+        pending_tracks = [tracks[pending[i]] for i in kept]
+        for track in pending_tracks:
+            self.tracker.mark_pending(track)
+        return tracks, pending_tracks, face_imgs
 
-            print(f"Left Eye: {left_eye_center}, Right Eye: {right_eye_center}, Center: {eye_center}, Angle: {angle}")
+    def match_faces(self, face_vectors):
+        if face_vectors is None:
+            return None
+        return self.db_manager.search_faces(face_vectors)
 
-            rotation_matrix = cv2.getRotationMatrix2D(eye_center, angle, 1.0)
+    def update_tracks(self, tracks, face_vectors, matches, face_imgs=None):
+        if face_vectors is None:
+            print("Failed to vectorize face.")
+            return
+        for i, (track, face_vector, (result, similarity)) in enumerate(zip(tracks, face_vectors, matches)):
+            print(f"Recognition result for track {track.track_id}: {result}, Similarity: {similarity}")
+            track.face_vector = face_vector
+            track.similarity = similarity
+            track.name = result  # None when nothing cleared the database's similarity threshold
+            track.identified = True
+            if result is None and self.enrollment_queue is not None and face_imgs is not None:
+                self.enrollment_queue.add(track, face_imgs[i], face_vector)
 
-            aligned_face = cv2.warpAffine(face_img, rotation_matrix, (face_img.shape[1], face_img.shape[0]))
+    def draw_results(self, frame, faces, tracks):
+        for face, track in zip(faces, tracks):
+            x, y, w, h = face['box']
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
+            
+            if track.name:
+                cv2.putText(frame, track.name, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (36,255,12), 2)
+            elif track.identified:
+                # Unknown faces are queued for labeling with enrollfaces.py
+                label = f"Unknown {track.unknown_cluster[:6]}" if track.unknown_cluster else "Unknown"
+                cv2.putText(frame, label, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0,165,255), 2)
 
-            face_img = cv2.resize(aligned_face, (160, 160))
-            face_img = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
-            face_img = face_img.astype(np.float32) / 255.0  # Normalize to [0, 1]
-            return face_img
-        except Exception as e:
-            print(f"Error in preprocessing face: {e}")
-            return None 
+    def preprocess_faces(self, frame, faces, buffer=None):
+        return align_faces(frame, faces, buffer if buffer is not None else self.face_buffer)
 
     def vectorize_face(self, face_img):
+        face_vectors = self.vectorize_faces([face_img])
+        return face_vectors[0] if face_vectors is not None else None
+
+    def vectorize_faces(self, face_imgs):
+        # Returns an (N, 128) array of L2-normalized embeddings, one row per
+        # 160x160 RGB face in face_imgs
+        if len(face_imgs) == 0:
+            return np.empty((0, 128), dtype=np.float32)
         try:
-            face_embedding = DeepFace.represent(face_img, model_name="Facenet", enforce_detection=False)[0]["embedding"]
-            return np.array(face_embedding)
+            batch = np.asarray(face_imgs, dtype=np.float32)
+            if self.embedding_cache is None:
+                return self.embed_batch(batch)
+            keys = [self.embedding_cache.key(face_img) for face_img in batch]
+            cached = self.embedding_cache.get_many(keys)
+            misses = [i for i, key in enumerate(keys) if key not in cached]
+            face_vectors = np.empty((len(batch), 128), dtype=np.float32)
+            for i, key in enumerate(keys):
+                if key in cached:
+                    face_vectors[i] = cached[key]
+            if misses:
+                face_vectors[misses] = self.embed_batch(batch[misses])
+                self.embedding_cache.put_many([keys[i] for i in misses], face_vectors[misses])
+            return face_vectors
         except Exception as e:
-            print(f"Error in vectorizing face: {e}")
-            return None
\ No newline at end of file
+            print(f"Error in vectorizing faces: {e}")
+            return None
+
+    def embed_batch(self, batch):
+        if self.embedding_model is None:
+            self.load_embedding_model()
+        face_vectors = []
+        for start in range(0, len(batch), self.batch_size):
+            embeddings = self.embedding_model(batch[start:start+self.batch_size], training=False)
+            face_vectors.append(np.asarray(embeddings))
+        face_vectors = np.concatenate(face_vectors)
+        return face_vectors / np.maximum(np.linalg.norm(face_vectors, axis=1, keepdims=True), 1e-12)
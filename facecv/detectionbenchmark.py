@@ -0,0 +1,81 @@
+import argparse
+import itertools
+import json
+import time
+import cv2
+from mtcnn import MTCNN
+from facedetector import AdaptiveFaceDetector
+from tracker import box_iou
+
+# Measures the FPS/accuracy tradeoff of AdaptiveFaceDetector settings on a
+# recorded video. Full-resolution MTCNN on every frame is the reference;
+# a reference face counts as found when a detection overlaps it with IoU >= 0.5.
+# Usage: python detectionbenchmark.py lobby.mp4 --scales 1.0 0.5 --every 1 3 --motion 4.0
+
+def read_frames(source, max_frames):
+    cap = cv2.VideoCapture(source)
+    frames = []
+    while max_frames is None or len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+def run_config(face_detector, frames):
+    face_detector.reset()
+    detections = []
+    start = time.perf_counter()
+    for frame in frames:
+        detections.append([face['box'] for face in face_detector.detect_faces(frame)])
+    elapsed = time.perf_counter() - start
+    return detections, len(frames) / elapsed
+
+def score(reference, detections, iou_threshold=0.5):
+    found = total = 0
+    for expected, boxes in zip(reference, detections):
+        total += len(expected)
+        if expected and boxes:
+            found += int((box_iou(expected, boxes).max(axis=1) >= iou_threshold).sum())
+    return found / total if total else 1.0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark adaptive MTCNN detection on a recorded video.")
+    parser.add_argument("video", help="Video file or image sequence pattern (e.g. frames/%%04d.jpg)")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.5, 0.33])
+    parser.add_argument("--every", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--motion", type=float, nargs="*", default=[], help="Motion thresholds to also try")
+    parser.add_argument("--max-frames", type=int, default=None)
+    args = parser.parse_args()
+
+    frames = read_frames(args.video, args.max_frames)
+    if not frames:
+        raise SystemExit(f"Could not read any frames from {args.video}.")
+
+    detector = MTCNN()
+    detector.detect_faces(frames[0])  # Warm up so model loading is not timed
+
+    reference, reference_fps = run_config(AdaptiveFaceDetector(detector), frames)
+    results = []
+    for scale, every, motion in itertools.product(args.scales, args.every, [None] + args.motion):
+        face_detector = AdaptiveFaceDetector(detector, scale=scale, detect_every=every, motion_threshold=motion)
+        detections, fps = run_config(face_detector, frames)
+        results.append({
+            "scale": scale,
+            "detect_every": every,
+            "motion_threshold": motion,
+            "fps": round(fps, 2),
+            "speedup": round(fps / reference_fps, 2),
+            "recall": round(score(reference, detections), 4),
+            "detector_runs": face_detector.detector_runs,
+            "full_res_fallbacks": face_detector.full_res_fallbacks,
+        })
+
+    print(f"Frames: {len(frames)}, reference (full-res every frame): {reference_fps:.2f} FPS")
+    print(f"{'scale':>6} {'every':>5} {'motion':>7} {'fps':>8} {'speedup':>8} {'recall':>7} {'runs':>6} {'fallbk':>6}")
+    for r in results:
+        motion = "-" if r["motion_threshold"] is None else r["motion_threshold"]
+        print(f"{r['scale']:>6} {r['detect_every']:>5} {motion:>7} {r['fps']:>8} {r['speedup']:>8} "
+              f"{r['recall']:>7} {r['detector_runs']:>6} {r['full_res_fallbacks']:>6}")
+    print(json.dumps(results))
@@ -0,0 +1,90 @@
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+
+class EmbeddingCache:
+    # Content-addressed cache of face embeddings in a SQLite file. The key is a
+    # hash of the preprocessed face crop together with the model name and the
+    # preprocessing version, so changing either one never returns a stale
+    # vector. Entries are evicted least recently used once there are more
+    # than max_entries.
+    def __init__(self, path="embedding_cache.sqlite", model_name="Facenet", preprocess_version="", max_entries=200_000):
+        self.model_name = model_name
+        self.preprocess_version = preprocess_version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()  # The recognition pipeline embeds from several threads
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key BLOB PRIMARY KEY,
+                    vector BLOB,
+                    last_used INTEGER
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+        # Access counter for LRU order; cheaper and more stable than timestamps
+        self.clock = self.conn.execute('SELECT COALESCE(MAX(last_used), 0) FROM embeddings').fetchone()[0]
+        self.size = self.conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+
+    def key(self, face_img):
+        face_img = np.ascontiguousarray(face_img)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{self.model_name}\0{self.preprocess_version}\0{face_img.dtype.str}{face_img.shape}\0".encode())
+        digest.update(face_img.data)
+        return digest.digest()
+
+    def tick(self, count):
+        first = self.clock + 1
+        self.clock += count
+        return range(first, self.clock + 1)
+
+    def get_many(self, keys):
+        # Returns {key: vector} for the keys that are cached and marks them as used
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):  # Stay under SQLite's bound-parameter limit
+                chunk = keys[start:start+500]
+                rows = self.conn.execute(
+                    f'SELECT key, vector FROM embeddings WHERE key IN ({",".join("?" * len(chunk))})', chunk).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+            if found:
+                with self.conn:
+                    self.conn.executemany('UPDATE embeddings SET last_used = ? WHERE key = ?',
+                                          zip(self.tick(len(found)), found))
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self.lock:
+            with self.conn:
+                # A key fixes its vector, so existing rows only need their last_used
+                # bumped; counting the inserted rows keeps size without a COUNT(*) scan
+                before = self.conn.total_changes
+                self.conn.executemany('INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)',
+                                      zip(keys, (vector.tobytes() for vector in vectors), self.tick(len(keys))))
+                added = self.conn.total_changes - before
+                if added < len(keys):
+                    self.conn.executemany('UPDATE embeddings SET last_used = ? WHERE key = ?',
+                                          zip(self.tick(len(keys)), keys))
+                self.size += added
+                if self.size > self.max_entries:
+                    evicted = self.conn.execute('''
+                        DELETE FROM embeddings WHERE key IN (
+                            SELECT key FROM embeddings ORDER BY last_used LIMIT ?
+                        )
+                    ''', (self.size - self.max_entries,)).rowcount
+                    self.size -= evicted
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        self.conn.close()
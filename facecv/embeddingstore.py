@@ -0,0 +1,186 @@
+import json
+import os
+import numpy as np
+
+class EmbeddingStore:
+    # Append-only storage for (name, embedding) records:
+    #   <base>.vectors.npy  compacted segment, memory-mapped on load
+    #   <base>.vectors.log  raw float32 rows appended since the last compaction
+    #   <base>.names.jsonl  one JSON line per record, written after its vector
+    #   <base>.pruned.log   int64 ids of records dropped from the exemplar gallery
+    # A write only touches the tail of the log and names files. On load the
+    # record count is the shorter of the two, so a torn write is discarded.
+    # The log is folded into the segment once it is as large as the segment
+    # (and at least compact_every rows), so each record is rewritten O(log N)
+    # times over the store's life and appends stay O(1) amortized.
+    def __init__(self, base_path, dim=128, compact_every=1024):
+        self.dim = dim
+        self.compact_every = compact_every
+        self.vectors_path = base_path + ".vectors.npy"
+        self.log_path = base_path + ".vectors.log"
+        self.names_path = base_path + ".names.jsonl"
+        self.pruned_path = base_path + ".pruned.log"
+        self.load()
+        self.log_file = open(self.log_path, "ab")
+        self.names_file = open(self.names_path, "a", encoding="utf-8")
+        self.pruned_file = open(self.pruned_path, "ab")
+
+    def load(self):
+        records, torn = self.read_records()
+        self.names = [record["name"] for record in records]
+        if os.path.exists(self.vectors_path):
+            self.base = np.load(self.vectors_path, mmap_mode="r")
+        else:
+            self.base = np.empty((0, self.dim), dtype=np.float32)
+
+        row_bytes = self.dim * 4
+        log_rows = os.path.getsize(self.log_path) // row_bytes if os.path.exists(self.log_path) else 0
+        count = min(len(self.names), len(self.base) + log_rows)
+        self.base = self.base[:count]
+        log_rows = max(0, count - len(self.base))
+
+        # Drop anything past the last complete record
+        if torn or len(records) > count:
+            records = records[:count]
+            self.names = self.names[:count]
+            self.rewrite_records(records)
+        # Where each record came from (e.g. an image path), so bulk imports can resume
+        self.sources = {record["source"] for record in records if "source" in record}
+        # record id -> embedding space, for records from an older, incompatible
+        # embedding pipeline; untagged records are in the current one
+        self.spaces = {record_id: record["space"] for record_id, record in enumerate(records) if "space" in record}
+        if os.path.exists(self.log_path) and os.path.getsize(self.log_path) != log_rows * row_bytes:
+            with open(self.log_path, "r+b") as f:
+                f.truncate(log_rows * row_bytes)
+
+        self.log_rows = log_rows
+        self.map_log()
+        self.pruned = self.read_pruned(count)
+
+    def map_log(self):
+        # Replaces the log's in-memory blocks with one memory map of the file, so
+        # a long log between compactions does not have to stay in RAM
+        if self.log_rows > 0:
+            self.log = [np.memmap(self.log_path, dtype=np.float32, mode="r", shape=(self.log_rows, self.dim))]
+        else:
+            self.log = []
+        self.memory_rows = 0
+
+    def read_records(self):
+        if not os.path.exists(self.names_path):
+            return [], False
+        with open(self.names_path, "r", encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        # The last element is either empty or a partially written line
+        return [json.loads(line) for line in lines[:-1]], lines[-1] != ""
+
+    def read_pruned(self, count):
+        if not os.path.exists(self.pruned_path):
+            return set()
+        with open(self.pruned_path, "rb") as f:
+            data = f.read()
+        whole = len(data) - len(data) % 8
+        if whole != len(data):
+            with open(self.pruned_path, "r+b") as f:
+                f.truncate(whole)
+        return {int(i) for i in np.frombuffer(data[:whole], dtype=np.int64) if i < count}
+
+    def rewrite_records(self, records):
+        tmp_path = self.names_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, self.names_path)
+
+    def __len__(self):
+        return len(self.names)
+
+    def segments(self):
+        # Yields (first_record, vectors) for each stored block without copying
+        start = 0
+        for block in [self.base] + self.log:
+            if len(block):
+                yield start, block
+                start += len(block)
+
+    def take(self, record_ids):
+        # Rows for the given record ids, read through the memory maps; only the
+        # blocks that hold one of them are touched
+        record_ids = np.asarray(record_ids, dtype=np.int64).reshape(-1)
+        out = np.empty((len(record_ids), self.dim), dtype=np.float32)
+        starts, blocks = zip(*self.segments()) if len(self) else ((), ())
+        ends = np.cumsum([len(block) for block in blocks])
+        which = np.searchsorted(ends, record_ids, side="right")
+        for b in np.unique(which):
+            mask = which == b
+            out[mask] = blocks[b][record_ids[mask] - starts[b]]
+        return out
+
+    def vectors(self):
+        blocks = [block for _, block in self.segments()]
+        if not blocks:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.concatenate(blocks)
+
+    def append(self, vectors, names, sources=None, space=None):
+        # One write per file for the whole batch; the records only become
+        # visible on reload once their names line is complete
+        vectors = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        records = [{"name": name} for name in names]
+        if space is not None:
+            for record_id, record in enumerate(records, len(self.names)):
+                record["space"] = space
+                self.spaces[record_id] = space
+        if sources is not None:
+            for record, source in zip(records, sources):
+                record["source"] = source
+            self.sources.update(sources)
+        self.log_file.write(vectors.tobytes())
+        self.log_file.flush()
+        self.names_file.write("".join(json.dumps(record) + "\n" for record in records))
+        self.names_file.flush()
+        self.log.append(vectors)
+        self.log_rows += len(vectors)
+        self.memory_rows += len(vectors)
+        self.names.extend(names)
+        if self.log_rows >= max(self.compact_every, len(self.base)):
+            self.compact()
+        elif self.memory_rows >= self.compact_every:
+            self.map_log()
+
+    def mark_pruned(self, record_ids):
+        # Records stay in the log (centroids still use every sample); this only
+        # remembers which ones the exemplar gallery has dropped
+        record_ids = np.asarray(record_ids, dtype=np.int64).reshape(-1)
+        self.pruned_file.write(record_ids.tobytes())
+        self.pruned_file.flush()
+        self.pruned.update(int(i) for i in record_ids)
+
+    def compact(self):
+        # Fold the log into a new .npy segment. If this is interrupted after the
+        # replace, load() sees more rows than names and discards the stale log.
+        if self.log_rows == 0:
+            return
+        # Written block by block, so the whole store is never in RAM at once
+        tmp_path = self.vectors_path + ".tmp.npy"
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(len(self), self.dim))
+        for start, block in self.segments():
+            out[start:start + len(block)] = block
+        out.flush()
+        del out
+        os.replace(tmp_path, self.vectors_path)
+        # Swap in an empty log rather than truncating, so arrays still mapped
+        # onto the old log stay valid
+        self.log_file.close()
+        open(self.log_path + ".tmp", "wb").close()
+        os.replace(self.log_path + ".tmp", self.log_path)
+        self.log_file = open(self.log_path, "ab")
+        self.base = np.load(self.vectors_path, mmap_mode="r")
+        self.log_rows = 0
+        self.map_log()
+        print(f"Compacted {len(self)} embeddings into {self.vectors_path}.")
+
+    def close(self):
+        self.log_file.close()
+        self.names_file.close()
+        self.pruned_file.close()
@@ -0,0 +1,52 @@
+import argparse
+import json
+import os
+import time
+from enrollmentqueue import write_label
+
+# Labels the unknown faces buffered by the running recognizer (main.py).
+#   python enrollfaces.py list
+#   python enrollfaces.py label 3f9c2a1b7d04 "Jane Doe"
+#   python enrollfaces.py discard 3f9c2a1b7d04
+# Crops for each cluster are in pending_faces/<cluster_id>/*.jpg. The
+# recognizer enrolls a labeled cluster within a second, or at its next start.
+
+def list_clusters(directory):
+    clusters = []
+    for cluster_id in sorted(os.listdir(directory)):
+        info_path = os.path.join(directory, cluster_id, "cluster.json")
+        if not os.path.exists(info_path):
+            continue
+        with open(info_path, encoding="utf-8") as f:
+            info = json.load(f)
+        labeled = os.path.exists(os.path.join(directory, cluster_id, "label.json"))
+        clusters.append(dict(info, cluster_id=cluster_id, labeled=labeled))
+    return sorted(clusters, key=lambda cluster: cluster["last_seen"], reverse=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Label unknown faces collected by the live recognizer.")
+    parser.add_argument("--dir", default="pending_faces")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list")
+    label_parser = commands.add_parser("label")
+    label_parser.add_argument("cluster_id")
+    label_parser.add_argument("name")
+    discard_parser = commands.add_parser("discard")
+    discard_parser.add_argument("cluster_id")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        clusters = list_clusters(args.dir) if os.path.isdir(args.dir) else []
+        if not clusters:
+            print("No unknown faces waiting.")
+        for cluster in clusters:
+            last_seen = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(cluster["last_seen"]))
+            status = " (labeled, waiting for the recognizer)" if cluster["labeled"] else ""
+            print(f"{cluster['cluster_id']}  {cluster['samples']:>3} samples  last seen {last_seen}  "
+                  f"{os.path.join(args.dir, cluster['cluster_id'])}{status}")
+    elif args.command == "label":
+        write_label(os.path.join(args.dir, args.cluster_id), {"name": args.name})
+        print(f"Labeled {args.cluster_id} as {args.name}.")
+    else:
+        write_label(os.path.join(args.dir, args.cluster_id), {"discard": True})
+        print(f"Discarded {args.cluster_id}.")
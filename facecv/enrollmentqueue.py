@@ -0,0 +1,210 @@
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+import cv2
+import numpy as np
+
+class UnknownCluster:
+    def __init__(self, cluster_id, first_seen):
+        self.cluster_id = cluster_id
+        self.first_seen = first_seen
+        self.last_seen = first_seen
+        self.embeddings = []
+        self.total = np.zeros(128, dtype=np.float64)  # Sum of every sample seen, for the centroid
+
+    def centroid(self):
+        return self.total / max(np.linalg.norm(self.total), 1e-12)
+
+class UnknownFaceQueue:
+    # Collects faces the database did not recognize without ever blocking the
+    # recognition loop. Unknown embeddings are grouped into clusters (one per
+    # apparent person), and up to max_samples crops and embeddings per cluster
+    # are written by a background thread to
+    #   <directory>/<cluster_id>/<n>.jpg, embeddings.npy, cluster.json
+    # Labeling happens out of band: enrollfaces.py (or label()) writes a
+    # label.json into the cluster folder, and the background thread enrolls
+    # the buffered embeddings into the database under that name.
+    def __init__(self, db_manager, directory="pending_faces", max_samples=10, cluster_threshold=0.6,
+                 max_clusters=200, poll_interval=1.0):
+        self.db_manager = db_manager
+        self.directory = directory
+        self.max_samples = max_samples
+        self.cluster_threshold = cluster_threshold  # Cosine similarity to join an existing cluster
+        self.max_clusters = max_clusters
+        self.poll_interval = poll_interval
+        self.clusters = {}
+        self.lock = threading.Lock()
+        self.tasks = queue.Queue()
+        self.errors = 0  # Samples and labels that failed and were skipped
+        self.bad_labels = {}  # cluster_id -> (mtime, size) of a label.json that could not be read
+        os.makedirs(directory, exist_ok=True)
+        self.load()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def load(self):
+        # Pick up clusters buffered by a previous run so they can still be labeled
+        for cluster_id in os.listdir(self.directory):
+            cluster_dir = os.path.join(self.directory, cluster_id)
+            embeddings_path = os.path.join(cluster_dir, "embeddings.npy")
+            if not os.path.exists(embeddings_path):
+                continue
+            with open(os.path.join(cluster_dir, "cluster.json"), encoding="utf-8") as f:
+                info = json.load(f)
+            cluster = UnknownCluster(cluster_id, info["first_seen"])
+            cluster.last_seen = info["last_seen"]
+            cluster.embeddings = list(np.load(embeddings_path))
+            cluster.total = np.sum(cluster.embeddings, axis=0, dtype=np.float64)
+            self.clusters[cluster_id] = cluster
+        if self.clusters:
+            print(f"Loaded {len(self.clusters)} unlabeled face clusters from {self.directory}.")
+
+    def add(self, track, face_img, face_vector):
+        # Called from the embed workers for each unrecognized face. Only does
+        # in-memory work; disk writes are handed to the background thread.
+        # Returns the cluster id the face was assigned to.
+        now = time.time()
+        with self.lock:
+            cluster = self.clusters.get(track.unknown_cluster)
+            if cluster is None:
+                cluster = self.nearest_cluster(face_vector)
+            if cluster is None:
+                cluster = UnknownCluster(uuid.uuid4().hex[:12], now)
+                self.clusters[cluster.cluster_id] = cluster
+                self.evict()
+            cluster.last_seen = now
+            cluster.total += face_vector
+            track.unknown_cluster = cluster.cluster_id
+            if len(cluster.embeddings) >= self.max_samples:
+                return cluster.cluster_id
+            cluster.embeddings.append(np.asarray(face_vector, dtype=np.float32))
+            task = (cluster.cluster_id, len(cluster.embeddings) - 1, np.array(cluster.embeddings),
+                    {"first_seen": cluster.first_seen, "last_seen": cluster.last_seen})
+        # face_img is a view into a reused buffer; keep an 8-bit BGR copy for the labeler
+        crop = cv2.cvtColor(np.clip(face_img * 255, 0, 255).astype(np.uint8), cv2.COLOR_RGB2BGR)
+        self.tasks.put(task + (crop,))
+        return task[0]
+
+    def nearest_cluster(self, face_vector):
+        if not self.clusters:
+            return None
+        clusters = list(self.clusters.values())
+        similarities = np.array([cluster.centroid() for cluster in clusters]) @ face_vector
+        best = int(np.argmax(similarities))
+        return clusters[best] if similarities[best] >= self.cluster_threshold else None
+
+    def evict(self):
+        # Forget the clusters seen least recently once there are too many
+        while len(self.clusters) > self.max_clusters:
+            stale = min(self.clusters.values(), key=lambda cluster: cluster.last_seen)
+            del self.clusters[stale.cluster_id]
+            self.tasks.put((stale.cluster_id, None, None, None, None))
+
+    def pending(self):
+        with self.lock:
+            return [{"cluster_id": cluster.cluster_id, "samples": len(cluster.embeddings),
+                     "first_seen": cluster.first_seen, "last_seen": cluster.last_seen}
+                    for cluster in self.clusters.values()]
+
+    def label(self, cluster_id, name):
+        # Same effect as enrollfaces.py label; enrollment happens on the background thread
+        write_label(os.path.join(self.directory, cluster_id), {"name": name})
+
+    def discard(self, cluster_id):
+        write_label(os.path.join(self.directory, cluster_id), {"discard": True})
+
+    def _run(self):
+        # Errors (a full disk, a bad label file) are reported and the failing
+        # sample or poll skipped; the thread keeps going so enrollment does not
+        # silently stop for the rest of the session
+        last_poll = 0.0
+        while self.running or not self.tasks.empty():
+            try:
+                cluster_id, index, embeddings, info, crop = self.tasks.get(timeout=self.poll_interval)
+            except queue.Empty:
+                pass
+            else:
+                try:
+                    cluster_dir = os.path.join(self.directory, cluster_id)
+                    if index is None:
+                        shutil.rmtree(cluster_dir, ignore_errors=True)
+                    elif cluster_id in self.clusters:  # Not labeled or evicted in the meantime
+                        self.write_sample(cluster_dir, index, embeddings, info, crop)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Error saving unknown face sample for {cluster_id}, skipped: {e}")
+            if time.perf_counter() - last_poll >= self.poll_interval:
+                try:
+                    self.apply_labels()
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Error applying face labels: {e}")
+                last_poll = time.perf_counter()
+
+    def write_sample(self, cluster_dir, index, embeddings, info, crop):
+        os.makedirs(cluster_dir, exist_ok=True)
+        cv2.imwrite(os.path.join(cluster_dir, f"{index}.jpg"), crop)
+        # embeddings.npy goes last; load() treats a folder without it as incomplete
+        write_json(os.path.join(cluster_dir, "cluster.json"), dict(info, samples=len(embeddings)))
+        tmp_path = os.path.join(cluster_dir, "embeddings.tmp.npy")
+        np.save(tmp_path, embeddings)
+        os.replace(tmp_path, os.path.join(cluster_dir, "embeddings.npy"))
+
+    def apply_labels(self):
+        with self.lock:
+            cluster_ids = list(self.clusters)
+        for cluster_id in cluster_ids:
+            label_path = os.path.join(self.directory, cluster_id, "label.json")
+            if not os.path.exists(label_path):
+                continue
+            modified = None
+            try:
+                stat = os.stat(label_path)
+                modified = (stat.st_mtime_ns, stat.st_size)
+                if self.bad_labels.get(cluster_id) == modified:
+                    continue  # Already reported; tried again once the file changes
+                with open(label_path, encoding="utf-8") as f:
+                    label = json.load(f)
+                if not isinstance(label, dict):
+                    raise ValueError(f"expected a JSON object, got {label!r}")
+            except (OSError, ValueError) as e:
+                self.bad_labels[cluster_id] = modified
+                self.errors += 1
+                print(f"Error reading label for {cluster_id}, skipped: {e}")
+                continue
+            self.bad_labels.pop(cluster_id, None)
+            with self.lock:
+                cluster = self.clusters.pop(cluster_id, None)
+            if cluster is None:
+                continue
+            if label.get("name") and cluster.embeddings:
+                # Tracks of this person pick the new identity up at their next re-verification
+                try:
+                    self.db_manager.add_faces(np.array(cluster.embeddings), [label["name"]] * len(cluster.embeddings))
+                except Exception as e:
+                    with self.lock:
+                        self.clusters.setdefault(cluster_id, cluster)  # Tried again at the next poll
+                    self.errors += 1
+                    print(f"Error enrolling {label['name']} from {cluster_id}: {e}")
+                    continue
+            shutil.rmtree(os.path.join(self.directory, cluster_id), ignore_errors=True)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+def write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def write_label(cluster_dir, label):
+    if not os.path.isdir(cluster_dir):
+        raise ValueError(f"No pending face cluster at {cluster_dir}")
+    write_json(os.path.join(cluster_dir, "label.json"), label)
@@ -1,54 +1,240 @@
-import faiss
 import pickle
 import numpy as np
 import os
+import threading
+from embeddingstore import EmbeddingStore
+from faceindex import FaceIndex
+
+# Embedding space of vectors imported from the old pickle database: DeepFace.represent
+# on unaligned crops, not comparable with the aligned, batched Facenet embeddings
+# the store holds now. They are kept for reference but never indexed.
+LEGACY_SPACE = "deepface-represent-unaligned"
 
 class FaceDatabaseManager:
-    def __init__(self, db_path="face_recognition.db"):
+    def __init__(self, db_path="face_recognition.db", compact_every=1024, index_type="auto",
+                 mode="centroid", similarity_threshold=0.6, max_exemplars=20, search_k=10, aggregation="vote"):
+        # mode="centroid" indexes one running-mean vector per person; mode="exemplar"
+        # indexes every stored sample (up to max_exemplars per person, pruned for
+        # diversity) and labels a query by aggregating its search_k nearest
+        # exemplars, either by vote count or by the nearest one (aggregation="nearest").
+        # similarity_threshold is a cosine similarity; 0.6 matches DeepFace's
+        # Facenet cosine-distance threshold of 0.4.
+        if mode not in ("centroid", "exemplar"):
+            raise ValueError(f"Unknown gallery mode {mode}")
+        if aggregation not in ("vote", "nearest"):
+            raise ValueError(f"Unknown aggregation {aggregation}")
         self.db_path = db_path
-        self.index = faiss.IndexFlatL2(128)  # 128 is the dimension of face vectors
+        self.mode = mode
+        self.similarity_threshold = similarity_threshold
+        self.max_exemplars = max_exemplars
+        self.search_k = search_k
+        self.aggregation = aggregation
+        # Each identity keeps a stable index id (its position in self.names), so
+        # replacing one centroid never shifts the ids of other identities. In
+        # exemplar mode the index ids are store record ids instead.
+        # index_type is one of faceindex.INDEX_TYPES; "auto" picks by gallery size.
+        # The index re-ranks and retrains from index_vectors, so it keeps no copy of its own.
+        self.index = FaceIndex(128, index_type=index_type, metric="ip", vectors=self.index_vectors)  # 128 is the dimension of face vectors
         self.names = []
-        self.embeddings = {}
-
-        if os.path.exists(db_path):
-            with open(db_path, 'rb') as f:
-                data = pickle.load(f)
-                if isinstance(data, tuple) and len(data) == 3:
-                    self.index, self.names, self.embeddings = data
-                elif isinstance(data, tuple) and len(data) == 2:
-                    self.index, self.names = data
-                    self.embeddings = {name: [] for name in self.names}
-                else:
-                    print("Unknown database format. Starting fresh.")
+        self.name_to_id = {}
+        self.sums = np.empty((0, 128), dtype=np.float64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.exemplars = {}  # identity id -> record ids currently in the index
+        self.record_labels = np.empty(0, dtype=np.int64)  # record id -> identity id
+        # Embeddings live in an append-only log next to db_path; the index is
+        # rebuilt from the memory-mapped vectors on startup
+        self.store = EmbeddingStore(os.path.splitext(db_path)[0], compact_every=compact_every)
+        # Searches come from the embed workers while labeled faces can be added
+        # from the enrollment queue's thread
+        self.lock = threading.RLock()
+
+        if len(self.store) == 0 and os.path.exists(db_path):
+            self.import_legacy_database(db_path)
+
+        if len(self.store) > 0:
+            self.build_index()
             print(f"Loaded {len(self.names)} faces from database.")
         else:
             print("No existing database found. Starting fresh.")
 
-    def add_face(self, face_vector, name):
-        if name in self.embeddings:
-            self.embeddings[name].append(face_vector)
-            average_embedding = np.mean(self.embeddings[name], axis=0)
-            index_pos = self.names.index(name)
-            self.index.remove_ids(np.array([index_pos]))
-            self.index.add(np.array([average_embedding]))
+    def import_legacy_database(self, db_path):
+        # One-time migration from the old whole-file pickle format; db_path itself is left untouched
+        with open(db_path, 'rb') as f:
+            data = pickle.load(f)
+        vectors, names = [], []
+        if isinstance(data, tuple) and len(data) == 3:
+            _, _, embeddings = data
+            for name, samples in embeddings.items():
+                vectors.extend(samples)
+                names.extend([name] * len(samples))
+        elif isinstance(data, tuple) and len(data) == 2:
+            index, index_names = data
+            vectors = index.reconstruct_n(0, index.ntotal)
+            names = list(index_names)
         else:
-            self.index.add(np.array([face_vector]))
+            print("Unknown database format. Starting fresh.")
+            return
+        if names:
+            self.store.append(vectors, names, space=LEGACY_SPACE)
+            self.store.compact()
+        print(f"Imported {len(names)} embeddings from {db_path}.")
+        if names:
+            print(f"Warning: these embeddings come from the old DeepFace.represent pipeline and are not used for "
+                  f"matching. Re-enroll {', '.join(sorted(set(names)))} from their photos (script.py or bulkenroll.py).")
+
+    def build_index(self):
+        # Records from another embedding space (see LEGACY_SPACE) get no identity and stay out of the index
+        self.record_labels = np.full(len(self.store), -1, dtype=np.int64)
+        for start, vectors in self.store.segments():
+            record_ids = np.arange(start, start + len(vectors))
+            current = np.array([record_id not in self.store.spaces for record_id in record_ids], dtype=bool)
+            ids = np.array([self.get_or_create_id(self.store.names[record_id]) for record_id in record_ids[current]],
+                           dtype=np.int64)
+            self.record_labels[record_ids[current]] = ids
+            np.add.at(self.sums, ids, vectors[current])
+            np.add.at(self.counts, ids, 1)
+
+        if self.mode == "centroid":
+            count = len(self.names)
+            self.index.add(self.centroids(np.arange(count)), np.arange(count))
+            return
+
+        for start, vectors in self.store.segments():
+            record_ids = np.arange(start, start + len(vectors))
+            live = np.array([record_id not in self.store.pruned and record_id not in self.store.spaces
+                             for record_id in record_ids], dtype=bool)
+            self.index.add(vectors[live], record_ids[live])
+            for record_id in record_ids[live]:
+                self.exemplars[self.record_labels[record_id]].append(int(record_id))
+        for face_id in range(len(self.names)):
+            self.prune_exemplars(face_id)
+
+    def index_vectors(self, ids):
+        # Centroids are computed from the running sums; exemplars are read from
+        # the memory-mapped store by record id
+        if self.mode == "centroid":
+            return self.centroids(ids).astype(np.float32)
+        return self.store.take(ids)
+
+    def centroids(self, face_ids):
+        # Mean direction of each person's samples, unit length for cosine search
+        centroids = self.sums[face_ids] / self.counts[face_ids, None]
+        return centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+
+    def get_or_create_id(self, name):
+        face_id = self.name_to_id.get(name)
+        if face_id is None:
+            face_id = len(self.names)
+            self.name_to_id[name] = face_id
             self.names.append(name)
-            self.embeddings[name] = [face_vector]
-        self.save_database()
-        print(f"Added face for {name} to database.")
-
-    def search_face(self, face_vector, threshold=0.000003):  # Stricter threshold
-        if self.index.ntotal > 0:
-            D, I = self.index.search(np.array([face_vector]), 1)
-            print(f"Search distances: {D}, indices: {I}")
-            if D[0][0] < threshold:
-                print(f"Face recognized as {self.names[I[0][0]]} with distance {D[0][0]}")
-                return self.names[I[0][0]], D[0][0]
-            print(f"Face not recognized, closest distance {D[0][0]} is above threshold {threshold}.")
-        return None, None
+            self.exemplars[face_id] = []
+            if face_id >= len(self.counts):
+                capacity = max(16, 2 * len(self.counts))
+                self.sums = np.resize(self.sums, (capacity, 128))
+                self.counts = np.resize(self.counts, capacity)
+            self.sums[face_id] = 0
+            self.counts[face_id] = 0
+        return face_id
+
+    def add_face(self, face_vector, name):
+        self.add_faces([face_vector], [name])
+
+    def add_faces(self, face_vectors, names, sources=None):
+        # Commits a batch as one append to the store, then updates the index
+        # once per touched identity
+        face_vectors = np.asarray(face_vectors, dtype=np.float32).reshape(-1, 128)
+        if len(face_vectors) == 0:
+            return
+        with self.lock:
+            self.add_batch(face_vectors, names, sources)
+
+    def add_batch(self, face_vectors, names, sources):
+        first_record = len(self.store)
+        self.store.append(face_vectors, names, sources)
+        record_ids = np.arange(first_record, first_record + len(names))
+        fresh = {self.get_or_create_id(name) for name in names if name not in self.name_to_id}
+        face_ids = np.array([self.name_to_id[name] for name in names])
+        if record_ids[-1] >= len(self.record_labels):
+            self.record_labels = np.resize(self.record_labels, max(16, 2 * len(self.record_labels), record_ids[-1] + 1))
+        self.record_labels[record_ids] = face_ids
+        # Running mean: the centroid update costs the same no matter how many samples this person has
+        np.add.at(self.sums, face_ids, face_vectors)
+        np.add.at(self.counts, face_ids, 1)
+        touched = [int(face_id) for face_id in np.unique(face_ids)]
+        if self.mode == "exemplar":
+            self.index.add(face_vectors, record_ids)
+            for record_id, face_id in zip(record_ids, face_ids):
+                self.exemplars[face_id].append(int(record_id))
+            for face_id in touched:
+                self.prune_exemplars(face_id)
+        else:
+            added = [face_id for face_id in touched if face_id in fresh]
+            existing = [face_id for face_id in touched if face_id not in fresh]
+            if added:
+                self.index.add(self.centroids(added), added)
+            if existing:
+                self.index.update(self.centroids(existing), existing)
+        if len(names) == 1:
+            print(f"Added face for {names[0]} to database.")
+        else:
+            print(f"Added {len(names)} faces for {len(touched)} people to database.")
+
+    def prune_exemplars(self, face_id):
+        # Keep at most max_exemplars per person by repeatedly dropping the
+        # exemplar that is most similar to another one of theirs
+        record_ids = self.exemplars[face_id]
+        if len(record_ids) <= self.max_exemplars:
+            return
+        vectors = self.index.reconstruct(record_ids)
+        similarity = vectors @ vectors.T
+        np.fill_diagonal(similarity, -np.inf)
+        keep = list(range(len(record_ids)))
+        dropped = []
+        while len(keep) > self.max_exemplars:
+            redundancy = similarity[np.ix_(keep, keep)].max(axis=1)
+            dropped.append(record_ids[keep.pop(int(np.argmax(redundancy)))])
+        self.exemplars[face_id] = [record_ids[i] for i in keep]
+        self.index.remove(dropped)
+        self.store.mark_pruned(dropped)
+
+    def search_faces(self, face_vectors):
+        # One batched top-k search for every face; returns [(name, similarity)]
+        # with (None, None) for faces below the similarity threshold
+        face_vectors = np.asarray(face_vectors, dtype=np.float32).reshape(-1, 128)
+        if self.index.ntotal == 0 or len(face_vectors) == 0:
+            return [(None, None)] * len(face_vectors)
+        k = 1 if self.mode == "centroid" else self.search_k
+        with self.lock:
+            S, I = self.index.search(face_vectors, k)
+            if self.mode == "exemplar":
+                I = np.where(I >= 0, self.record_labels[np.maximum(I, 0)], -1)
+        return [self.aggregate(similarities, face_ids) for similarities, face_ids in zip(S, I)]
+
+    def aggregate(self, similarities, face_ids):
+        votes = {}
+        for similarity, face_id in zip(similarities, face_ids):
+            if face_id < 0 or similarity < self.similarity_threshold:
+                continue
+            count, best = votes.get(face_id, (0, similarity))
+            votes[face_id] = (count + 1, max(best, similarity))
+        if not votes:
+            return None, None
+        if self.aggregation == "vote":
+            face_id = max(votes, key=lambda i: votes[i])  # Most votes, ties go to the closer match
+        else:
+            face_id = max(votes, key=lambda i: votes[i][1])
+        return self.names[face_id], float(votes[face_id][1])
+
+    def search_face(self, face_vector):
+        name, similarity = self.search_faces([face_vector])[0]
+        if name:
+            print(f"Face recognized as {name} with similarity {similarity}")
+        else:
+            print(f"Face not recognized, no match above similarity {self.similarity_threshold}.")
+        return name, similarity
 
     def save_database(self):
-        with open(self.db_path, 'wb') as f:
-            pickle.dump((self.index, self.names, self.embeddings), f)
-        print("Database saved.")
\ No newline at end of file
+        # Every add_face is already durable in the log; this just folds it into the compacted segment
+        with self.lock:
+            self.store.compact()
+        print("Database saved.")
@@ -0,0 +1,66 @@
+import cv2
+
+class AdaptiveFaceDetector:
+    def __init__(self, detector, scale=1.0, detect_every=1, motion_threshold=None, min_confidence=0.9):
+        # scale: MTCNN runs on a copy resized by this factor, boxes are mapped back
+        # detect_every: run MTCNN on every k-th frame and reuse boxes in between
+        # motion_threshold: also run MTCNN early when the mean absolute difference
+        #   of a small grayscale thumbnail (0-255) exceeds this value
+        # min_confidence: re-run at full resolution when a downscaled detection
+        #   falls below this confidence or a previously seen face disappears
+        self.detector = detector
+        self.scale = scale
+        self.detect_every = max(1, detect_every)
+        self.motion_threshold = motion_threshold
+        self.min_confidence = min_confidence
+        self.reset()
+
+    def reset(self):
+        self.last_faces = None
+        self.frames_since_detection = 0
+        self.previous_thumbnail = None
+        self.detector_runs = 0
+        self.full_res_fallbacks = 0
+
+    def detect_faces(self, frame):
+        moved = self.detect_motion(frame)
+        due = self.last_faces is None or self.frames_since_detection + 1 >= self.detect_every
+        if not due and not moved:
+            self.frames_since_detection += 1
+            return self.last_faces
+
+        faces = self.run_detector(frame, self.scale)
+        if self.scale < 1.0 and self.needs_full_resolution(faces):
+            self.full_res_fallbacks += 1
+            faces = self.run_detector(frame, 1.0)
+
+        self.last_faces = faces
+        self.frames_since_detection = 0
+        return faces
+
+    def needs_full_resolution(self, faces):
+        if any(face['confidence'] < self.min_confidence for face in faces):
+            return True
+        return bool(self.last_faces) and len(faces) < len(self.last_faces)
+
+    def detect_motion(self, frame):
+        if self.motion_threshold is None:
+            return False
+        thumbnail = cv2.cvtColor(cv2.resize(frame, (80, 60), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        previous, self.previous_thumbnail = self.previous_thumbnail, thumbnail
+        if previous is None:
+            return True
+        return cv2.absdiff(thumbnail, previous).mean() > self.motion_threshold
+
+    def run_detector(self, frame, scale):
+        self.detector_runs += 1
+        if scale >= 1.0:
+            return self.detector.detect_faces(frame)
+        small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        faces = self.detector.detect_faces(small)
+        # Map boxes and keypoints back to full-resolution coordinates for cropping
+        for face in faces:
+            face['box'] = [int(round(v / scale)) for v in face['box']]
+            face['keypoints'] = {name: (int(round(x / scale)), int(round(y / scale)))
+                                 for name, (x, y) in face['keypoints'].items()}
+        return faces
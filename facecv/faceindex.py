@@ -0,0 +1,236 @@
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("auto", "flat", "ivf", "hnsw", "ivfpq")
+
+# Trainable backends stay on a flat index until there is enough data to train them
+MIN_TRAINING_SIZE = {"ivf": 1_000, "ivfpq": 10_000}
+
+def choose_index_type(size):
+    # HNSW is opt-in only: FAISS cannot delete from it, so every update leaves
+    # a stale entry behind until the next rebuild
+    if size < 10_000:
+        return "flat"
+    if size < 1_000_000:
+        return "ivf"
+    return "ivfpq"
+
+class FaceIndex:
+    # ANN index with stable int64 ids. Full-precision vectors are needed so the
+    # backend can be (re)trained or swapped transparently and so candidates can
+    # be re-ranked with exact distances. With vectors(ids) -> float32 rows given,
+    # they are read from there (e.g. a memory-mapped EmbeddingStore) and the
+    # index keeps only the compressed backend in RAM, which is what makes
+    # IVF-PQ worth it at 10^6 faces; otherwise it keeps a copy of its own.
+    def __init__(self, dim=128, index_type="auto", metric="l2", nprobe=16, hnsw_m=32, pq_m=16, retrain_growth=4.0,
+                 vectors=None):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type}, expected one of {INDEX_TYPES}")
+        self.dim = dim
+        self.index_type = index_type
+        self.metric = metric
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.pq_m = pq_m
+        self.retrain_growth = retrain_growth
+        self.source = vectors
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.row_ids = np.empty(0, dtype=np.int64)
+        self.id_rows = np.empty(0, dtype=np.int64)  # id -> row, -1 when absent
+        self.size = 0
+        self.stale = 0
+        self.rebuild()
+
+    @property
+    def ntotal(self):
+        return self.size
+
+    def backend_type(self, size):
+        index_type = choose_index_type(size) if self.index_type == "auto" else self.index_type
+        if size < MIN_TRAINING_SIZE.get(index_type, 0):
+            return "flat"
+        return index_type
+
+    def faiss_metric(self):
+        return faiss.METRIC_INNER_PRODUCT if self.metric == "ip" else faiss.METRIC_L2
+
+    def create_backend(self, backend_type, size):
+        metric = self.faiss_metric()
+        if backend_type == "flat":
+            # Addressed by row rather than id, so a vector can be replaced in place (see flat_rows)
+            return faiss.IndexFlat(self.dim, metric)
+        if backend_type == "hnsw":
+            hnsw = faiss.IndexHNSWFlat(self.dim, self.hnsw_m, metric)
+            hnsw.hnsw.efConstruction = 80
+            hnsw.hnsw.efSearch = 64
+            return faiss.IndexIDMap2(hnsw)
+        nlist = max(1, min(int(4 * np.sqrt(size)), size // 39))
+        quantizer = faiss.IndexFlat(self.dim, metric)
+        if backend_type == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, self.dim, nlist, metric)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, self.dim, nlist, self.pq_m, 8, metric)
+        index.nprobe = min(self.nprobe, nlist)
+        return index
+
+    def rebuild(self):
+        self.backend = self.backend_type(self.size)
+        self.index = self.create_backend(self.backend, self.size)
+        vectors = self.lookup(self.row_ids[:self.size])
+        if not self.index.is_trained:
+            sample = vectors
+            if len(sample) > 256 * self.index.nlist:
+                sample = sample[np.random.default_rng(0).choice(len(sample), 256 * self.index.nlist, replace=False)]
+            self.index.train(sample)
+        if self.size:
+            self.add_to_backend(vectors, self.row_ids[:self.size])
+        self.trained_size = self.size
+        self.stale = 0
+
+    def needs_rebuild(self):
+        if self.backend_type(self.size) != self.backend:
+            return True
+        if self.backend in ("ivf", "ivfpq") and self.size > self.retrain_growth * self.trained_size:
+            return True  # Coarse centroids were trained on a much smaller gallery
+        return self.backend == "hnsw" and self.stale > 0.1 * max(self.size, 1)
+
+    def add_to_backend(self, vectors, ids):
+        if self.backend == "flat":
+            self.index.add(vectors)  # Appended rows line up with self.row_ids
+        else:
+            self.index.add_with_ids(vectors, ids)
+
+    def flat_rows(self):
+        # Writable view of the flat backend's vectors, one row per FaceIndex row.
+        # Taken fresh each time, since adding can move the storage.
+        return faiss.rev_swig_ptr(self.index.get_xb(), self.index.ntotal * self.dim).reshape(-1, self.dim)
+
+    def lookup(self, ids):
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if len(ids) == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        if self.source is not None:
+            return np.asarray(self.source(ids), dtype=np.float32).reshape(-1, self.dim)
+        return self.vectors[self.id_rows[ids]]
+
+    def reserve(self, count, max_id):
+        if count > len(self.row_ids):
+            capacity = max(count, 2 * len(self.row_ids), 16)
+            if self.source is None:
+                self.vectors = np.resize(self.vectors, (capacity, self.dim))
+            self.row_ids = np.resize(self.row_ids, capacity)
+        if max_id >= len(self.id_rows):
+            old = len(self.id_rows)
+            self.id_rows = np.resize(self.id_rows, max(max_id + 1, 2 * old, 16))
+            self.id_rows[old:] = -1
+
+    def add(self, vectors, ids):
+        vectors = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if len(ids) == 0:
+            return
+        self.reserve(self.size + len(ids), int(ids.max()))
+        rows = np.arange(self.size, self.size + len(ids))
+        if self.source is None:
+            self.vectors[rows] = vectors
+        self.row_ids[rows] = ids
+        self.id_rows[ids] = rows
+        self.size += len(ids)
+        if self.needs_rebuild():
+            self.rebuild()
+        else:
+            self.add_to_backend(vectors, ids)
+
+    def remove(self, ids):
+        ids = np.array([face_id for face_id in np.unique(np.asarray(ids, dtype=np.int64).reshape(-1))
+                        if 0 <= face_id < len(self.id_rows) and self.id_rows[face_id] >= 0], dtype=np.int64)
+        flat_rows = self.flat_rows() if self.backend == "flat" and len(ids) else None
+        for face_id in ids:
+            # Move the last row into the hole so the rows stay dense; the flat
+            # backend does the same, so removing costs O(1) per id there too
+            row, last = self.id_rows[face_id], self.size - 1
+            if self.source is None:
+                self.vectors[row] = self.vectors[last]
+            if flat_rows is not None:
+                flat_rows[row] = flat_rows[last]
+            self.row_ids[row] = self.row_ids[last]
+            self.id_rows[self.row_ids[row]] = row
+            self.id_rows[face_id] = -1
+            self.size -= 1
+        if len(ids) == 0:
+            return
+        if self.backend == "flat":
+            # Drop the now unused tail rows
+            self.index.codes.resize(self.size * self.index.code_size)
+            self.index.ntotal = self.size
+        elif self.backend == "hnsw":
+            self.stale += len(ids)  # Filtered out at search time until the next rebuild
+            if self.needs_rebuild():
+                self.rebuild()
+        else:
+            self.index.remove_ids(ids)
+
+    def update(self, vectors, ids):
+        # The flat backend overwrites existing rows in place, in O(1) per id; the
+        # others have to remove and re-add
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if self.backend != "flat":
+            self.remove(ids)
+            self.add(vectors, ids)
+            return
+        present = (ids < len(self.id_rows)) & (self.id_rows[np.minimum(ids, len(self.id_rows) - 1)] >= 0) \
+            if len(self.id_rows) else np.zeros(len(ids), dtype=bool)
+        rows = self.id_rows[ids[present]]
+        if self.source is None:
+            self.vectors[rows] = vectors[present]
+        self.flat_rows()[rows] = vectors[present]
+        self.add(vectors[~present], ids[~present])
+
+    def reconstruct(self, ids):
+        return self.lookup(ids)
+
+    def search(self, queries, k=1):
+        queries = np.ascontiguousarray(np.asarray(queries, dtype=np.float32).reshape(-1, self.dim))
+        D = np.full((len(queries), k), np.inf if self.metric == "l2" else -np.inf, dtype=np.float32)
+        I = np.full((len(queries), k), -1, dtype=np.int64)
+        if self.size == 0:
+            return D, I
+        # Over-fetch when HNSW still holds deleted entries, then re-rank the
+        # live candidates with exact distances from the full-precision vectors
+        fetch = min(self.size + self.stale, k if self.stale == 0 else 4 * k)
+        _, candidates = self.index.search(queries, fetch)
+        if self.backend == "flat":
+            candidates = np.where(candidates >= 0, self.row_ids[np.maximum(candidates, 0)], -1)
+        live = (candidates >= 0) & (candidates < len(self.id_rows))
+        rows = np.where(live, self.id_rows[np.clip(candidates, 0, len(self.id_rows) - 1)], -1)
+        live &= rows >= 0
+        # Missing and deleted candidates look up a live id instead, and are masked below
+        candidate_vectors = self.lookup(np.where(live, candidates, self.row_ids[0])).reshape(*candidates.shape, self.dim)
+        if self.metric == "ip":
+            scores = -np.einsum('qkd,qd->qk', candidate_vectors, queries)
+        else:
+            scores = np.sum((candidate_vectors - queries[:, None, :]) ** 2, axis=2)
+        scores = np.where(live, scores, np.inf)
+        if self.stale == 0:
+            order = np.argsort(scores, axis=1, kind="stable")[:, :k]
+            best = np.take_along_axis(scores, order, axis=1)
+            found = np.isfinite(best)
+            width = order.shape[1]
+            D[:, :width] = np.where(found, best if self.metric == "l2" else -best, D[:, :width])
+            I[:, :width] = np.where(found, np.take_along_axis(candidates, order, axis=1), -1)
+            return D, I
+        for q in range(len(queries)):
+            seen = set()
+            out = 0
+            for j in np.argsort(scores[q], kind="stable"):
+                face_id = candidates[q, j]
+                if not np.isfinite(scores[q, j]) or out == k:
+                    break
+                if face_id in seen:
+                    continue  # HNSW can return an id twice after an update
+                seen.add(face_id)
+                D[q, out] = scores[q, j] if self.metric == "l2" else -scores[q, j]
+                I[q, out] = face_id
+                out += 1
+        return D, I
@@ -0,0 +1,71 @@
+import argparse
+import json
+import time
+import faiss
+import numpy as np
+from faceindex import FaceIndex
+
+# Reports build time, recall@1 and single-query latency of each FaceIndex
+# backend on synthetic 128-d galleries. Queries are noisy copies of gallery
+# vectors, like a new photo of an enrolled person; recall@1 is measured
+# against exact brute-force search.
+# Usage: python indexbenchmark.py --sizes 1000 100000 1000000
+
+def make_gallery(size, dim, rng):
+    vectors = rng.standard_normal((size, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def make_queries(gallery, count, noise, rng):
+    picks = rng.choice(len(gallery), count, replace=len(gallery) < count)
+    queries = gallery[picks] + noise * rng.standard_normal((count, gallery.shape[1]), dtype=np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+def exact_top1(gallery, queries):
+    index = faiss.IndexFlatL2(gallery.shape[1])
+    index.add(gallery)
+    return index.search(queries, 1)[1][:, 0]
+
+def benchmark_backend(index_type, gallery, queries, expected):
+    start = time.perf_counter()
+    index = FaceIndex(gallery.shape[1], index_type=index_type)
+    index.add(gallery, np.arange(len(gallery)))
+    build_s = time.perf_counter() - start
+
+    _, I = index.search(queries, 1)
+    recall = float(np.mean(I[:, 0] == expected))
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, 1)
+        latencies.append(time.perf_counter() - start)
+    latencies_ms = 1000 * np.array(latencies)
+    return {
+        "backend": index.backend,
+        "build_s": round(build_s, 3),
+        "recall_at_1": round(recall, 4),
+        "query_ms_p50": round(float(np.percentile(latencies_ms, 50)), 4),
+        "query_ms_p99": round(float(np.percentile(latencies_ms, 99)), 4),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark FaceIndex backends on synthetic embeddings.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--backends", nargs="+", default=["flat", "ivf", "hnsw", "ivfpq", "auto"])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--noise", type=float, default=0.05, help="Per-dimension query noise")
+    parser.add_argument("--dim", type=int, default=128)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    for size in args.sizes:
+        gallery = make_gallery(size, args.dim, rng)
+        queries = make_queries(gallery, args.queries, args.noise, rng)
+        expected = exact_top1(gallery, queries)
+        for index_type in args.backends:
+            result = dict(size=size, index_type=index_type, **benchmark_backend(index_type, gallery, queries, expected))
+            results.append(result)
+            print(f"{size:>9} {index_type:>6} ({result['backend']:>5}): build {result['build_s']:>8}s  "
+                  f"recall@1 {result['recall_at_1']:.4f}  p50 {result['query_ms_p50']}ms  p99 {result['query_ms_p99']}ms")
+    print(json.dumps(results))
@@ -1,7 +1,23 @@
+import time
+started_at = time.perf_counter()
 from facedatamanager import FaceDatabaseManager
 from detection import FaceRecognizer
+from enrollmentqueue import UnknownFaceQueue
 
 if __name__ == "__main__":
+    # TensorFlow, MTCNN and Facenet are loaded by warmup(), before the camera
+    # opens, so the first frame is not slowed down by model loading
+    timings = {"imports": time.perf_counter() - started_at}
+    start = time.perf_counter()
     db_manager = FaceDatabaseManager()
-    recognizer = FaceRecognizer(db_manager)
-    recognizer.capture_and_recognize()
+    timings["load_database"] = time.perf_counter() - start
+    # Unrecognized faces are buffered to pending_faces/; label them with enrollfaces.py
+    enrollment_queue = UnknownFaceQueue(db_manager)
+    recognizer = FaceRecognizer(db_manager, enrollment_queue=enrollment_queue)
+    timings.update(recognizer.warmup())
+    print("Startup: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items())
+          + f", total {time.perf_counter() - started_at:.2f}s")
+    try:
+        recognizer.capture_and_recognize()
+    finally:
+        enrollment_queue.stop()
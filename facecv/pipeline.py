@@ -0,0 +1,208 @@
+import cv2
+import queue
+import threading
+import time
+from collections import deque
+from alignment import AlignedFaceBuffer
+
+class StageStats:
+    def __init__(self, name, window=100):
+        self.name = name
+        self.latencies = deque(maxlen=window)
+        self.processed = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.processed += 1
+
+    def drop(self, count=1):
+        with self.lock:
+            self.dropped += count
+
+    def summary(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            processed, dropped = self.processed, self.dropped
+        avg_ms = 1000 * sum(latencies) / len(latencies) if latencies else 0.0
+        max_ms = 1000 * max(latencies) if latencies else 0.0
+        return {"stage": self.name, "processed": processed, "dropped": dropped,
+                "avg_ms": round(avg_ms, 2), "max_ms": round(max_ms, 2)}
+
+def put_newest(q, item, stats):
+    # Bounded hand-off: when the next stage is behind, throw away the oldest
+    # queued item rather than blocking the producer or growing the backlog.
+    # Returns the discarded items so the caller can undo any bookkeeping.
+    dropped = []
+    while True:
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                dropped.append(q.get_nowait())
+                stats.drop()
+            except queue.Empty:
+                pass
+
+class LatestFrameGrabber:
+    def __init__(self, source=0, stats=None):
+        self.cap = cv2.VideoCapture(source)
+        self.stats = stats or StageStats("capture")
+        self.condition = threading.Condition()
+        self.latest = None
+        self.next_id = 0
+        self.last_read_id = -1
+        self.running = False
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.running:
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            self.stats.record(time.perf_counter() - start)
+            with self.condition:
+                # Only the newest frame is kept; anything not picked up yet is stale
+                if self.latest is not None and self.latest["id"] > self.last_read_id:
+                    self.stats.drop()
+                self.latest = {"id": self.next_id, "captured_at": time.perf_counter(), "frame": frame}
+                self.next_id += 1
+                self.condition.notify_all()
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def read(self, timeout=1.0):
+        with self.condition:
+            self.condition.wait_for(
+                lambda: not self.running or (self.latest is not None and self.latest["id"] > self.last_read_id),
+                timeout=timeout)
+            if self.latest is None or self.latest["id"] <= self.last_read_id:
+                return None
+            self.last_read_id = self.latest["id"]
+            return self.latest
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.cap.release()
+
+class RecognitionPipeline:
+    def __init__(self, recognizer, source=0, embed_workers=2, queue_size=2, stats_interval=5.0):
+        self.recognizer = recognizer
+        self.stats = {name: StageStats(name) for name in ("capture", "detect", "embed", "render", "end_to_end")}
+        start = time.perf_counter()
+        self.grabber = LatestFrameGrabber(source, self.stats["capture"])
+        print(f"Opened video source {source} in {time.perf_counter() - start:.2f}s.")
+        self.embed_queue = queue.Queue(maxsize=queue_size)
+        self.render_queue = queue.Queue(maxsize=queue_size)
+        # Aligned-face buffers cycle between the detector and the embed workers
+        # so crops are written into preallocated memory instead of new arrays
+        self.free_buffers = queue.Queue()
+        self.embed_workers = embed_workers
+        self.stats_interval = stats_interval
+        self.running = False
+
+    def run(self):
+        self.running = True
+        self.grabber.start()
+        threads = [threading.Thread(target=self._detect_loop, daemon=True)]
+        threads += [threading.Thread(target=self._embed_loop, daemon=True) for _ in range(self.embed_workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            self._render_loop()
+        finally:
+            self.running = False
+            for thread in threads:
+                thread.join()
+            self.grabber.stop()
+            cv2.destroyAllWindows()
+            self.print_stats()
+
+    def _detect_loop(self):
+        while self.running:
+            job = self.grabber.read(timeout=0.5)
+            if job is None:
+                if not self.grabber.running:
+                    self.running = False
+                continue
+            start = time.perf_counter()
+            frame = cv2.flip(job["frame"], 1)
+            faces = self.recognizer.detect_faces(frame)
+            buffer = self.acquire_buffer()
+            tracks, pending_tracks, face_imgs = self.recognizer.track_faces(frame, faces, buffer)
+            job = dict(job, frame=frame, faces=faces, tracks=tracks,
+                       pending_tracks=pending_tracks, face_imgs=face_imgs, buffer=buffer)
+            self.stats["detect"].record(time.perf_counter() - start)
+            if len(face_imgs) == 0:
+                # Every face already has a cached identity, skip the embed stage
+                self.free_buffers.put(buffer)
+                put_newest(self.render_queue, job, self.stats["detect"])
+                continue
+            for dropped_job in put_newest(self.embed_queue, job, self.stats["detect"]):
+                self.free_buffers.put(dropped_job["buffer"])
+                for track in dropped_job["pending_tracks"]:
+                    track.last_verified = None  # Never embedded, retry on the next frame
+
+    def acquire_buffer(self):
+        try:
+            return self.free_buffers.get_nowait()
+        except queue.Empty:
+            return AlignedFaceBuffer()
+
+    def _embed_loop(self):
+        while self.running:
+            try:
+                job = self.embed_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            start = time.perf_counter()
+            face_vectors = self.recognizer.vectorize_faces(job["face_imgs"])
+            matches = self.recognizer.match_faces(face_vectors)
+            # Unknown crops are copied into the enrollment queue before the buffer is reused
+            self.recognizer.update_tracks(job["pending_tracks"], face_vectors, matches, job["face_imgs"])
+            self.free_buffers.put(job["buffer"])
+            self.stats["embed"].record(time.perf_counter() - start)
+            put_newest(self.render_queue, job, self.stats["embed"])
+
+    def _render_loop(self):
+        started_at = time.perf_counter()
+        last_rendered_id = -1
+        last_report = time.perf_counter()
+        while self.running:
+            try:
+                job = self.render_queue.get(timeout=0.05)
+            except queue.Empty:
+                job = None
+            if job is not None:
+                if job["id"] < last_rendered_id:
+                    # A slower embed worker finished after a newer frame was shown
+                    self.stats["render"].drop()
+                else:
+                    start = time.perf_counter()
+                    self.recognizer.draw_results(job["frame"], job["faces"], job["tracks"])
+                    cv2.imshow('Face Recognition', job["frame"])
+                    if last_rendered_id < 0:
+                        print(f"First frame shown {time.perf_counter() - started_at:.2f}s after the camera opened.")
+                    last_rendered_id = job["id"]
+                    now = time.perf_counter()
+                    self.stats["render"].record(now - start)
+                    self.stats["end_to_end"].record(now - job["captured_at"])
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+            if time.perf_counter() - last_report > self.stats_interval:
+                self.print_stats()
+                last_report = time.perf_counter()
+
+    def print_stats(self):
+        for stats in self.stats.values():
+            print(stats.summary())
@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Headless regression benchmark: runs the full recognizer on a recorded video
+# or image sequence, one frame at a time with no GUI and no frame dropping,
+# so runs are reproducible. Reports per-stage latency, end-to-end FPS and
+# peak RSS as JSON.
+# Usage: python replay.py lobby.mp4 --json results.json
+#        python replay.py frames/ --detect-scale 0.5 --detect-every 3
+
+STAGES = ("decode", "detect", "align", "embed", "search", "draw")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def read_frames(source, max_frames=None):
+    # Yields frames from a video file, a cv2 image pattern (frames/%04d.jpg)
+    # or a directory of images in name order
+    if os.path.isdir(source):
+        paths = sorted(os.path.join(source, filename) for filename in os.listdir(source)
+                       if filename.lower().endswith(IMAGE_EXTENSIONS))
+        frames = (cv2.imread(path) for path in paths)
+    else:
+        cap = cv2.VideoCapture(source)
+        def video_frames():
+            try:
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        return
+                    yield frame
+            finally:
+                cap.release()
+        frames = video_frames()
+    for count, frame in enumerate(frames):
+        if max_frames is not None and count >= max_frames:
+            return
+        if frame is not None:
+            yield frame
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def latency_summary(seconds):
+    ms = 1000 * np.asarray(seconds)
+    if len(ms) == 0:
+        return {"mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"mean_ms": round(float(ms.mean()), 3), "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3), "max_ms": round(float(ms.max()), 3)}
+
+def replay(recognizer, frames, warmup=1, writer=None):
+    timings = {stage: [] for stage in STAGES}
+    latencies = []
+    faces_seen = embedded = 0
+    start = None
+    frames = iter(frames)
+    frame_index = 0
+    while True:
+        t0 = time.perf_counter()
+        frame = next(frames, None)
+        if frame is None:
+            break
+        t1 = time.perf_counter()
+        faces = recognizer.detect_faces(frame)
+        t2 = time.perf_counter()
+        tracks, pending_tracks, face_imgs = recognizer.track_faces(frame, faces)
+        t3 = time.perf_counter()
+        face_vectors = recognizer.vectorize_faces(face_imgs) if len(face_imgs) else None
+        t4 = time.perf_counter()
+        if face_vectors is not None:
+            recognizer.update_tracks(pending_tracks, face_vectors, recognizer.match_faces(face_vectors), face_imgs)
+        t5 = time.perf_counter()
+        recognizer.draw_results(frame, faces, tracks)
+        if writer is not None:
+            writer.write(frame)
+        t6 = time.perf_counter()
+
+        frame_index += 1
+        if frame_index <= warmup:
+            continue  # Model loading and graph tracing would dominate the first frames
+        if start is None:
+            start = t0
+        for stage, seconds in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t6 - t5)):
+            timings[stage].append(seconds)
+        latencies.append(t6 - t1)  # Frame in hand to frame drawn
+        faces_seen += len(faces)
+        embedded += len(face_imgs)
+    elapsed = time.perf_counter() - start if start is not None else 0.0
+
+    measured = len(latencies)
+    return {
+        "frames": measured,
+        "warmup_frames": min(warmup, frame_index),
+        "elapsed_s": round(elapsed, 3),
+        "fps": round(measured / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency": latency_summary(latencies),
+        "stages": {stage: latency_summary(seconds) for stage, seconds in timings.items()},
+        "faces_detected": faces_seen,
+        "faces_embedded": embedded,
+        "detector_runs": recognizer.face_detector.detector_runs,
+        "full_res_fallbacks": recognizer.face_detector.full_res_fallbacks,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded video through the recognizer without a GUI.")
+    parser.add_argument("source", help="Video file, image pattern (frames/%%04d.jpg) or directory of images")
+    parser.add_argument("--db", default="face_recognition.db")
+    parser.add_argument("--mode", default="centroid", choices=["centroid", "exemplar"])
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--warmup", type=int, default=1, help="Leading frames excluded from the statistics")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--reverify-every", type=int, default=30)
+    parser.add_argument("--detect-scale", type=float, default=1.0)
+    parser.add_argument("--detect-every", type=int, default=1)
+    parser.add_argument("--motion-threshold", type=float, default=None)
+    parser.add_argument("--output", help="Optional video file to write the annotated frames to")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    from facedatamanager import FaceDatabaseManager
+    from detection import FaceRecognizer
+
+    db_manager = FaceDatabaseManager(db_path=args.db, mode=args.mode)
+    recognizer = FaceRecognizer(db_manager, batch_size=args.batch_size, reverify_every=args.reverify_every,
+                                detect_scale=args.detect_scale, detect_every=args.detect_every,
+                                motion_threshold=args.motion_threshold)
+    startup = recognizer.warmup()
+
+    frames = read_frames(args.source, args.max_frames)
+    writer = None
+    if args.output:
+        first = next(frames, None)
+        if first is None:
+            raise SystemExit(f"Could not read any frames from {args.source}.")
+        height, width = first.shape[:2]
+        writer = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(*"mp4v"), 30, (width, height))
+        frames = (frame for batch in ([first], frames) for frame in batch)
+
+    results = replay(recognizer, frames, warmup=args.warmup, writer=writer)
+    if writer is not None:
+        writer.release()
+    if results["frames"] == 0:
+        raise SystemExit(f"No frames measured from {args.source} (after {args.warmup} warmup frames).")
+    results = dict(source=args.source, config={
+        "batch_size": args.batch_size, "reverify_every": args.reverify_every, "detect_scale": args.detect_scale,
+        "detect_every": args.detect_every, "motion_threshold": args.motion_threshold, "mode": args.mode,
+        "index_backend": db_manager.index.backend},
+        startup_s={phase: round(seconds, 3) for phase, seconds in startup.items()}, **results)
+
+    print(f"{results['frames']} frames in {results['elapsed_s']}s: {results['fps']} FPS, "
+          f"p50 {results['latency']['p50_ms']}ms, p95 {results['latency']['p95_ms']}ms, "
+          f"p99 {results['latency']['p99_ms']}ms, peak RSS {results['peak_rss_mb']} MB")
+    for stage, summary in results["stages"].items():
+        print(f"  {stage:>6}: p50 {summary['p50_ms']:>9}ms  p95 {summary['p95_ms']:>9}ms  p99 {summary['p99_ms']:>9}ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 import cv2
-from deepface import DeepFace
-import numpy as np
 from facedatamanager import FaceDatabaseManager
+from detection import FaceRecognizer
+from embeddingcache import EmbeddingCache
+from alignment import PREPROCESS_VERSION
 
 # Initialize the FaceDatabaseManager
 db_manager = FaceDatabaseManager(db_path="face_recognition.db")
+# Re-running this script on the same photo reuses the stored embedding
+embedding_cache = EmbeddingCache(model_name="Facenet", preprocess_version=PREPROCESS_VERSION)
+# The photo goes through the same detection, alignment and L2-normalized Facenet
+# embedding as live recognition, so the stored vector is comparable with the camera's
+recognizer = FaceRecognizer(db_manager, embedding_cache=embedding_cache)
 
 # Load the face image from a file
 face_image_path = "luckyblue.jpg"  # Replace with the path to your face image
@@ -13,32 +19,14 @@ face_img = cv2.imread(face_image_path)
 if face_img is None:
     print("Failed to load the face image.")
 else:
-    # Preprocess the face image
-    def preprocess_face(face_img):
-        try:
-            face_img = cv2.resize(face_img, (160, 160))
-            face_img = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
-            face_img = face_img.astype(np.float32) / 255.0  # Normalize to [0, 1]
-            return face_img
-        except Exception as e:
-            print(f"Error in preprocessing face: {e}")
-            return None
+    # Detect and align the face; the photo should show one person, so use the largest face
+    faces = recognizer.detect_faces(face_img)
+    faces = sorted(faces, key=lambda face: face['box'][2] * face['box'][3], reverse=True)[:1]
+    kept, face_imgs = recognizer.preprocess_faces(face_img, faces)
 
-    preprocessed_face = preprocess_face(face_img)
-
-    if preprocessed_face is not None:
+    if kept:
         # Vectorize the face image
-        def vectorize_face(face_img):
-            try:
-                # Using DeepFace to get face embedding
-                face_embedding = DeepFace.represent(face_img, model_name="Facenet", enforce_detection=False)[0]["embedding"]
-                print(f"Face embedding: {face_embedding}")
-                return np.array(face_embedding)
-            except Exception as e:
-                print(f"Error in vectorizing face: {e}")
-                return None
-
-        face_vector = vectorize_face(preprocessed_face)
+        face_vector = recognizer.vectorize_face(face_imgs[0])
 
         if face_vector is not None:
             # Add the face vector to the database
@@ -48,4 +36,6 @@ else:
         else:
             print("Failed to vectorize the face image.")
     else:
-        print("Failed to preprocess the face image.")
+        print("No face found in the image.")
+
+embedding_cache.close()
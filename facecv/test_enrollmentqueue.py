@@ -0,0 +1,68 @@
+import json
+import os
+import time
+import numpy as np
+from enrollmentqueue import UnknownFaceQueue
+
+class Track:
+    unknown_cluster = None
+
+class FlakyDatabase:
+    # Fails the first enrollment, as a full disk or locked database would
+    def __init__(self):
+        self.calls = 0
+        self.enrolled = []
+
+    def add_faces(self, embeddings, names):
+        self.calls += 1
+        if self.calls == 1:
+            raise OSError("No space left on device")
+        self.enrolled.extend(names)
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
+
+def face(rng):
+    vector = rng.standard_normal(128)
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+def test_thread_survives_failed_samples_and_labels(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    db = FlakyDatabase()
+    pending = UnknownFaceQueue(db, directory=str(tmp_path), poll_interval=0.01)
+    try:
+        write_sample = pending.write_sample
+        def failing_write_sample(cluster_dir, index, *args):
+            if index == 0:
+                raise OSError("No space left on device")
+            write_sample(cluster_dir, index, *args)
+        monkeypatch.setattr(pending, "write_sample", failing_write_sample)
+
+        image = np.zeros((32, 32, 3), dtype=np.float32)
+        first, second = Track(), Track()
+        first_id = pending.add(first, image, face(rng))
+        second_id = pending.add(second, image, face(rng))
+        pending.add(first, image, face(rng))
+        wait_for(lambda: os.path.exists(os.path.join(tmp_path, first_id, "embeddings.npy")))
+        assert pending.errors == 2  # The first sample of each cluster was skipped
+
+        # A malformed label is reported once and does not hold up other clusters
+        os.makedirs(os.path.join(tmp_path, second_id), exist_ok=True)
+        with open(os.path.join(tmp_path, second_id, "label.json"), "w", encoding="utf-8") as f:
+            f.write('{"name": ')
+        pending.label(first_id, "patient0")
+        wait_for(lambda: db.enrolled)
+        assert db.enrolled == ["patient0", "patient0"]
+        assert pending.errors == 4  # Bad label, then the first (retried) enrollment
+        assert [cluster["cluster_id"] for cluster in pending.pending()] == [second_id]
+
+        with open(os.path.join(tmp_path, second_id, "label.json"), "w", encoding="utf-8") as f:
+            json.dump({"name": "patient1"}, f)
+        wait_for(lambda: not pending.pending())
+        assert db.enrolled[2:] == ["patient1"]
+        assert pending.thread.is_alive()
+    finally:
+        pending.stop()
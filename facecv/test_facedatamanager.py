@@ -0,0 +1,73 @@
+import pickle
+import numpy as np
+import pytest
+from facedatamanager import FaceDatabaseManager
+
+NAMES = [f"patient{i}" for i in range(12)]
+
+def unit(vectors):
+    return (vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)).astype(np.float32)
+
+def enroll_interleaved(db, identities, rng, rounds=20):
+    # Every round adds one noisy sample for a random subset of people, in a
+    # random order and batch size, so updates for different people interleave
+    samples = {name: [] for name in NAMES}
+    for _ in range(rounds):
+        names = list(rng.choice(NAMES, size=rng.integers(1, len(NAMES) + 1), replace=True))
+        vectors = unit(identities[[NAMES.index(name) for name in names]] + 0.3 * rng.standard_normal((len(names), 128)) / np.sqrt(128))
+        for start in range(0, len(names), 3):
+            db.add_faces(vectors[start:start + 3], names[start:start + 3])
+        for name, vector in zip(names, vectors):
+            samples[name].append(vector)
+    return samples
+
+def assert_identities(db, identities, samples):
+    enrolled = [name for name in NAMES if samples[name]]
+    results = db.search_faces(identities[[NAMES.index(name) for name in enrolled]])
+    assert [name for name, _ in results] == enrolled
+    if db.mode == "centroid":
+        # Running means match a from-scratch mean over every stored sample
+        for name in enrolled:
+            face_id = db.name_to_id[name]
+            expected = unit(np.mean(samples[name], axis=0))
+            assert np.allclose(db.centroids([face_id])[0], expected, atol=1e-5)
+            assert db.counts[face_id] == len(samples[name])
+    else:
+        assert all(len(record_ids) <= db.max_exemplars for record_ids in db.exemplars.values())
+        assert db.index.ntotal == sum(len(record_ids) for record_ids in db.exemplars.values())
+
+@pytest.mark.parametrize("mode", ["centroid", "exemplar"])
+def test_identities_survive_interleaved_updates_and_reload(tmp_path, mode):
+    rng = np.random.default_rng(0)
+    identities = unit(rng.standard_normal((len(NAMES), 128)))
+    db_path = str(tmp_path / "faces.db")
+    db = FaceDatabaseManager(db_path, compact_every=16, index_type="flat", mode=mode, max_exemplars=5)
+    samples = enroll_interleaved(db, identities, rng)
+    assert_identities(db, identities, samples)
+
+    db.save_database()
+    reloaded = FaceDatabaseManager(db_path, index_type="flat", mode=mode, max_exemplars=5)
+    assert reloaded.names == db.names
+    assert_identities(reloaded, identities, samples)
+
+    # Updates after a reload land on the same identities
+    samples2 = enroll_interleaved(reloaded, identities, rng, rounds=5)
+    for name in NAMES:
+        samples[name] += samples2[name]
+    assert_identities(reloaded, identities, samples)
+
+@pytest.mark.parametrize("mode", ["centroid", "exemplar"])
+def test_legacy_embeddings_stay_out_of_the_index(tmp_path, mode):
+    rng = np.random.default_rng(1)
+    db_path = str(tmp_path / "faces.db")
+    with open(db_path, "wb") as f:
+        pickle.dump((None, None, {"sophia": list(unit(rng.standard_normal((3, 128))))}), f)
+    db = FaceDatabaseManager(db_path, index_type="flat", mode=mode)
+    assert len(db.store) == 3 and db.index.ntotal == 0 and db.names == []
+
+    vector = unit(rng.standard_normal(128))
+    db.add_face(vector, "sophia")
+    reloaded = FaceDatabaseManager(db_path, index_type="flat", mode=mode)
+    assert reloaded.index.ntotal == 1
+    assert reloaded.counts[reloaded.name_to_id["sophia"]] == 1
+    assert reloaded.search_faces([vector])[0][0] == "sophia"
@@ -0,0 +1,53 @@
+import time
+import numpy as np
+import pytest
+from faceindex import FaceIndex
+
+def unit(vectors):
+    return (vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)).astype(np.float32)
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_random_updates_match_brute_force(index_type):
+    rng = np.random.default_rng(0)
+    index = FaceIndex(16, index_type=index_type, metric="ip")
+    expected = {}
+    for step in range(300):
+        op = rng.integers(3)
+        ids = rng.choice(200, size=rng.integers(1, 5), replace=False)
+        vectors = unit(rng.standard_normal((len(ids), 16)))
+        if op == 0:
+            ids = [i for i in ids if i not in expected]
+            index.add(vectors[:len(ids)], ids)
+            expected.update(zip(ids, vectors))
+        elif op == 1:
+            index.update(vectors, ids)
+            expected.update(zip(ids, vectors))
+        else:
+            index.remove(ids)
+            for i in ids:
+                expected.pop(i, None)
+        assert index.ntotal == len(expected)
+    ids = np.array(sorted(expected))
+    assert np.allclose(index.reconstruct(ids), np.stack([expected[i] for i in ids]))
+    queries = unit(rng.standard_normal((50, 16)))
+    _, I = index.search(queries, 1)
+    assert np.array_equal(I[:, 0], ids[np.argmax(queries @ np.stack([expected[i] for i in ids]).T, axis=1)])
+
+def update_seconds(size, updates=200):
+    rng = np.random.default_rng(0)
+    index = FaceIndex(128, index_type="flat", metric="ip")
+    index.add(unit(rng.standard_normal((size, 128))), np.arange(size))
+    vectors = unit(rng.standard_normal((updates, 128)))
+    ids = rng.integers(size, size=updates)
+    start = time.perf_counter()
+    for vector, face_id in zip(vectors, ids):
+        index.update(vector, [face_id])
+    return time.perf_counter() - start
+
+def test_flat_update_does_not_grow_with_the_index():
+    # Replacing a centroid is done in place: 100x the identities should not
+    # cost anywhere near 100x per update (it did when update rebuilt the array)
+    update_seconds(1_000)  # Warm up
+    small = min(update_seconds(1_000) for _ in range(3))
+    large = min(update_seconds(100_000) for _ in range(3))
+    assert large < 10 * small
@@ -0,0 +1,68 @@
+import itertools
+import numpy as np
+
+class FaceTrack:
+    def __init__(self, track_id, box, frame_index):
+        self.track_id = track_id
+        self.box = box
+        self.last_seen = frame_index
+        self.last_verified = None  # Frame index of the last embedding request
+        self.name = None
+        self.similarity = None
+        self.face_vector = None
+        self.identified = False
+        self.unknown_cluster = None  # Enrollment queue cluster while the face is unrecognized
+
+def box_iou(boxes_a, boxes_b):
+    # boxes are MTCNN (x, y, w, h); returns a len(a) x len(b) IoU matrix
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    inter_w = np.clip(np.minimum(ax2[:, None], bx2[None, :]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    inter_h = np.clip(np.minimum(ay2[:, None], by2[None, :]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = inter_w * inter_h
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, max_missed=10, reverify_every=30):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.reverify_every = reverify_every
+        self.tracks = []
+        self.frame_index = 0
+        self.track_ids = itertools.count()
+
+    def update(self, faces):
+        # Greedily match detections to live tracks by IoU; returns one track per face
+        self.frame_index += 1
+        boxes = [face['box'] for face in faces]
+        matched = [None] * len(faces)
+        if boxes and self.tracks:
+            iou = box_iou(boxes, [track.box for track in self.tracks])
+            used_tracks = set()
+            for flat in np.argsort(-iou, axis=None):
+                face_pos, track_pos = np.unravel_index(flat, iou.shape)
+                if iou[face_pos, track_pos] < self.iou_threshold:
+                    break
+                if matched[face_pos] is not None or track_pos in used_tracks:
+                    continue
+                matched[face_pos] = self.tracks[track_pos]
+                used_tracks.add(track_pos)
+        for i, box in enumerate(boxes):
+            if matched[i] is None:
+                matched[i] = FaceTrack(next(self.track_ids), box, self.frame_index)
+                self.tracks.append(matched[i])
+            matched[i].box = box
+            matched[i].last_seen = self.frame_index
+        self.tracks = [track for track in self.tracks if self.frame_index - track.last_seen <= self.max_missed]
+        return matched
+
+    def needs_embedding(self, track):
+        if track.last_verified is None:
+            return True
+        return self.frame_index - track.last_verified >= self.reverify_every
+
+    def mark_pending(self, track):
+        track.last_verified = self.frame_index
@@ -0,0 +1,132 @@
+import json
+import os
+import numpy as np
+
+# Speech-to-text engines behind one interface. Every backend takes raw
+# little-endian int16 mono PCM:
+#   transcribe(pcm, rate) -> text, or "" when there is no speech
+#   start_stream(rate)    -> a session with accept(pcm) -> partial text or None,
+#                            and finish() -> final text
+# Real failures (network, missing model) raise TranscriptionError instead of
+# being turned into None or an error string.
+# The local engines are optional dependencies, imported when first built.
+
+class TranscriptionError(Exception):
+    pass
+
+class BufferedStream:
+    # Streaming fallback for engines that can only decode whole utterances:
+    # no partials, one transcribe() call at the end
+    def __init__(self, backend, rate):
+        self.backend = backend
+        self.rate = rate
+        self.chunks = []
+
+    def accept(self, pcm):
+        self.chunks.append(bytes(pcm))
+        return None
+
+    def finish(self):
+        return self.backend.transcribe(b"".join(self.chunks), self.rate)
+
+class GoogleBackend:
+    # The original path: one HTTPS round trip to the Google Web Speech API per utterance
+    name = "google"
+    streaming = False
+
+    def __init__(self, language="en-US"):
+        import speech_recognition as sr
+        self.sr = sr
+        self.recognizer = sr.Recognizer()
+        self.language = language
+
+    def transcribe(self, pcm, rate):
+        audio = self.sr.AudioData(bytes(pcm), rate, 2)
+        try:
+            return self.recognizer.recognize_google(audio, language=self.language)
+        except self.sr.UnknownValueError:
+            return ""
+        except self.sr.RequestError as e:
+            raise TranscriptionError(f"Google Speech Recognition request failed: {e}") from e
+
+    def start_stream(self, rate):
+        return BufferedStream(self, rate)
+
+class VoskStream:
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.final = []  # Vosk may finalize sentences inside one utterance
+
+    def accept(self, pcm):
+        if self.recognizer.AcceptWaveform(bytes(pcm)):
+            text = json.loads(self.recognizer.Result()).get("text", "")
+            if text:
+                self.final.append(text)
+            return " ".join(self.final)
+        partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        return " ".join(self.final + [partial]) if partial else None
+
+    def finish(self):
+        text = json.loads(self.recognizer.FinalResult()).get("text", "")
+        return " ".join(self.final + [text] if text else self.final)
+
+class VoskBackend:
+    # Offline Kaldi models on CPU, with partial hypotheses while audio streams in.
+    # model_path is an unpacked model from https://alphacephei.com/vosk/models
+    name = "vosk"
+    streaming = True
+
+    def __init__(self, model_path=None):
+        try:
+            from vosk import Model, KaldiRecognizer, SetLogLevel
+        except ImportError as e:
+            raise TranscriptionError("The vosk backend needs `pip install vosk`") from e
+        model_path = model_path or os.getenv("VOSK_MODEL_PATH", "vosk-model-small-en-us-0.15")
+        if not os.path.isdir(model_path):
+            raise TranscriptionError(f"Vosk model not found at {model_path}; set VOSK_MODEL_PATH")
+        SetLogLevel(-1)
+        self.model = Model(model_path)
+        self.KaldiRecognizer = KaldiRecognizer
+
+    def transcribe(self, pcm, rate):
+        stream = self.start_stream(rate)
+        stream.accept(pcm)
+        return stream.finish()
+
+    def start_stream(self, rate):
+        return VoskStream(self.KaldiRecognizer(self.model, rate))
+
+class WhisperBackend:
+    # Quantized Whisper on CPU through faster-whisper (CTranslate2, int8).
+    # Decodes whole utterances, so streaming sessions give no partials.
+    name = "whisper"
+    streaming = False
+
+    def __init__(self, model_size=None, compute_type="int8", cpu_threads=0):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise TranscriptionError("The whisper backend needs `pip install faster-whisper`") from e
+        model_size = model_size or os.getenv("WHISPER_MODEL", "base.en")
+        self.model = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+    def transcribe(self, pcm, rate):
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        if rate != 16000:
+            # Whisper expects 16 kHz; linear interpolation is plenty for speech
+            positions = np.arange(0, len(samples), rate / 16000.0)
+            samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+        segments, _ = self.model.transcribe(samples, beam_size=1, vad_filter=False)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def start_stream(self, rate):
+        return BufferedStream(self, rate)
+
+BACKENDS = {backend.name: backend for backend in (GoogleBackend, VoskBackend, WhisperBackend)}
+
+def create_backend(name=None, **kwargs):
+    # name defaults to $ASR_BACKEND, then "google"
+    name = name or os.getenv("ASR_BACKEND", "google")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown ASR backend {name}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](**kwargs)
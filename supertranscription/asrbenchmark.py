@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import time
+import wave
+import numpy as np
+from asrbackends import BACKENDS, create_backend
+
+# Compares speech-to-text backends on recorded WAV files. For each file and
+# backend it reports:
+#   rtf                whole-file transcription time / audio duration (below 1 is faster than real time)
+#   first_text_s       when the first words would appear if the file were spoken live
+#   final_after_end_s  how long after the speaker stops the final text is ready
+#   wer                word error rate, when a reference transcript <file>.txt exists
+# Live speech is simulated by feeding chunk_ms chunks in order without
+# sleeping: a chunk cannot be processed before it has been "spoken", and
+# not before the previous chunk is done.
+# Usage: python asrbenchmark.py recordings/*.wav --backends google vosk whisper --json asr.json
+
+def read_wav(path):
+    # 16-bit PCM as mono int16 bytes plus the sample rate
+    with wave.open(path, 'rb') as wf:
+        if wf.getsampwidth() != 2:
+            raise SystemExit(f"{path}: only 16-bit PCM WAV files are supported.")
+        rate = wf.getframerate()
+        samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        channels = wf.getnchannels()
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples.tobytes(), rate
+
+def word_error_rate(reference, hypothesis):
+    # Word-level Levenshtein distance divided by the reference length
+    ref = reference.lower().split()
+    hyp = hypothesis.lower().split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    row = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        previous, row[0] = row[0], i
+        for j, hyp_word in enumerate(hyp, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (ref_word != hyp_word))
+    return row[-1] / len(ref)
+
+def simulate_live(backend, pcm, rate, chunk_ms=100):
+    # Returns (text, first_text_s, final_after_end_s) in simulated seconds from the start of speech
+    duration = len(pcm) / 2 / rate
+    chunk_bytes = int(rate * chunk_ms / 1000) * 2
+    stream = backend.start_stream(rate)
+    clock = 0.0  # Simulated time at which the engine is free again
+    first_text = None
+    for offset in range(0, len(pcm), chunk_bytes):
+        chunk = pcm[offset:offset + chunk_bytes]
+        spoken = (offset + len(chunk)) / 2 / rate
+        start = time.perf_counter()
+        partial = stream.accept(chunk)
+        clock = max(clock, spoken) + time.perf_counter() - start
+        if partial and first_text is None:
+            first_text = clock
+    start = time.perf_counter()
+    text = stream.finish()
+    clock = max(clock, duration) + time.perf_counter() - start
+    if first_text is None and text:
+        first_text = clock
+    return text, first_text, clock - duration
+
+def benchmark(backend, pcm, rate, chunk_ms=100, reference=None):
+    duration = len(pcm) / 2 / rate
+    start = time.perf_counter()
+    text = backend.transcribe(pcm, rate)
+    transcribe_s = time.perf_counter() - start
+    live_text, first_text, final_after_end = simulate_live(backend, pcm, rate, chunk_ms)
+    results = {
+        "backend": backend.name,
+        "streaming": backend.streaming,
+        "duration_s": round(duration, 3),
+        "transcribe_s": round(transcribe_s, 3),
+        "rtf": round(transcribe_s / duration, 3) if duration else None,
+        "first_text_s": round(first_text, 3) if first_text is not None else None,
+        "final_after_end_s": round(final_after_end, 3),
+        "text": text,
+    }
+    if reference is not None:
+        results["wer"] = round(word_error_rate(reference, text), 3)
+        results["live_wer"] = round(word_error_rate(reference, live_text), 3)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare speech-to-text backends on recorded WAV files.")
+    parser.add_argument("wavs", nargs="+", help="16-bit PCM WAV files; <name>.txt next to one is used as its reference")
+    parser.add_argument("--backends", nargs="+", default=["google", "vosk"], choices=sorted(BACKENDS))
+    parser.add_argument("--chunk-ms", type=int, default=100, help="Chunk size for the simulated live feed")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    backends = []
+    for name in args.backends:
+        start = time.perf_counter()
+        backend = create_backend(name)
+        backends.append((backend, time.perf_counter() - start))
+
+    results = []
+    for path in args.wavs:
+        pcm, rate = read_wav(path)
+        reference_path = os.path.splitext(path)[0] + ".txt"
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path, encoding="utf-8") as f:
+                reference = f.read()
+        for backend, load_s in backends:
+            result = dict(file=path, load_s=round(load_s, 3), **benchmark(backend, pcm, rate, args.chunk_ms, reference))
+            results.append(result)
+            print(f"{os.path.basename(path)} [{backend.name}]: RTF {result['rtf']}, "
+                  f"first text at {result['first_text_s']}s, final {result['final_after_end_s']}s after speech"
+                  + (f", WER {result['wer']}" if "wer" in result else ""))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    main()
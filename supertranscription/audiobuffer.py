@@ -0,0 +1,50 @@
+import threading
+import numpy as np
+
+class AudioRingBuffer:
+    # Fixed-capacity buffer of int16 samples. Every write lands twice, at i and
+    # i + capacity, so any window of up to capacity samples is one contiguous
+    # slice and can be handed out as a memoryview without copying. Positions
+    # are absolute sample counts since the buffer was created.
+    #
+    # A view stays valid until the writer has advanced another
+    # (capacity - len(view)) samples; consumers that hold on to audio longer
+    # than that must copy it.
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.samples = np.zeros(2 * capacity, dtype=np.int16)
+        self.written = 0
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        samples = np.frombuffer(data, dtype=np.int16)
+        count = len(samples)
+        samples = samples[-self.capacity:]  # Anything older would be overwritten anyway
+        with self.lock:
+            start = (self.written + count - len(samples)) % self.capacity
+            first = min(len(samples), self.capacity - start)
+            self.samples[start:start+first] = samples[:first]
+            self.samples[start+self.capacity:start+self.capacity+first] = samples[:first]
+            rest = samples[first:]  # Wrapped around to the front
+            self.samples[:len(rest)] = rest
+            self.samples[self.capacity:self.capacity+len(rest)] = rest
+            self.written += count
+
+    def oldest(self):
+        return max(0, self.written - self.capacity)
+
+    def window(self, start, end):
+        # Samples [start, end) as a zero-copy memoryview of int16. Whatever part of
+        # the range has already been overwritten is skipped; returns (view, start)
+        # with the position the view actually starts at.
+        with self.lock:
+            end = min(end, self.written)
+            start = min(max(start, self.written - self.capacity, 0), end)
+        offset = start % self.capacity
+        return memoryview(self.samples[offset:offset+end-start]), start
+
+    def latest(self, count):
+        # The newest count samples (fewer if not that many were written yet)
+        with self.lock:
+            end = self.written
+        return self.window(end - count, end)[0]
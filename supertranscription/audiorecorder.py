@@ -1,8 +1,9 @@
 import pyaudio
 import threading
+from audiobuffer import AudioRingBuffer
 
 class AudioRecorder:
-    def __init__(self):
+    def __init__(self, buffer_seconds=60):
         self.chunk = 1024
         self.sample_format = pyaudio.paInt16
         self.channels = 1
@@ -13,23 +14,49 @@ class AudioRecorder:
                                   rate=self.rate,
                                   frames_per_buffer=self.chunk,
                                   input=True)
-        self.frames = []
+        # Preallocated, so memory stays flat however far behind the consumer falls;
+        # audio older than buffer_seconds is overwritten and counted as overrun
+        self.buffer = AudioRingBuffer(self.rate * self.channels * buffer_seconds)
+        self.read_position = 0
+        self.overrun_samples = 0
+        self.overruns = 0
         self.is_recording = False
         self.lock = threading.Lock()
 
     def start_recording(self):
         self.is_recording = True
-        self.frames = []
+        with self.lock:
+            self.read_position = self.buffer.written
         while self.is_recording:
             data = self.stream.read(self.chunk)
-            with self.lock:
-                self.frames.append(data)
+            self.buffer.write(data)
 
-    def get_chunk(self):
+    def read_new(self):
+        # Everything recorded since the previous call, as a zero-copy int16
+        # memoryview into the ring buffer (see AudioRingBuffer for how long it stays valid)
+        return self.read_new_at()[0]
+
+    def read_new_at(self):
+        # Same as read_new, plus the absolute sample position the view starts at
         with self.lock:
-            chunk = b''.join(self.frames)
-            self.frames = []
-        return chunk
+            view, start = self.buffer.window(self.read_position, self.buffer.written)
+            if start > self.read_position:
+                self.overruns += 1
+                self.overrun_samples += start - self.read_position
+                print(f"Audio consumer fell behind; dropped {(start - self.read_position) / self.rate:.1f}s of audio.")
+            self.read_position = start + len(view)
+        return view, start
+
+    def read_range(self, start, end):
+        # A copy of samples [start, end) as bytes, for audio that must outlive the ring buffer
+        return self.buffer.window(start, end)[0].tobytes()
+
+    def window(self, seconds):
+        # The most recent seconds of audio, for consumers that want overlapping windows
+        return self.buffer.latest(int(seconds * self.rate) * self.channels)
+
+    def get_chunk(self):
+        return self.read_new().tobytes()
 
     def stop_recording(self):
         self.is_recording = False
@@ -37,4 +64,4 @@ class AudioRecorder:
 
     def terminate(self):
         self.stream.close()
-        self.p.terminate()
\ No newline at end of file
+        self.p.terminate()
@@ -0,0 +1,58 @@
+import json
+import threading
+
+class DisplayFeed:
+    # What the AR display (arjs-text-demo/app.py) shows, as one JSON event per
+    # line in path. While a notes update streams in, the text of each new note
+    # ("+ ..." diff line) is written as it arrives:
+    #   {"type": "token", "bullet": n, "text": ..., "spoken_at": ..., "requested_at": ...}
+    # and once the update is applied the full list replaces it:
+    #   {"type": "notes", "notes": [...]}
+    # spoken_at (when the oldest utterance in the batch ended) and requested_at
+    # are wall-clock times, so the display can measure time to first visible token.
+    # The file is truncated when the feed is created, which starts a new visit.
+    def __init__(self, path="display_feed.jsonl"):
+        self.file = open(path, "w", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.bullets = 0
+        self.begin(None, None)
+
+    def write(self, event):
+        with self.lock:
+            self.file.write(json.dumps(event) + "\n")
+            self.file.flush()
+
+    def begin(self, spoken_at, requested_at):
+        # Starts a new streamed update
+        self.spoken_at = spoken_at
+        self.requested_at = requested_at
+        self.line = ""
+        self.bullet = None  # Number of the note being streamed, if any
+
+    def delta(self, text):
+        # Feeds streamed diff text; returns True if any of it became visible
+        visible = False
+        for i, part in enumerate(text.split("\n")):
+            if i:
+                self.line = ""
+                self.bullet = None
+            if self.bullet is None:
+                self.line += part
+                stripped = self.line.lstrip()
+                if not stripped.startswith("+") or not stripped[1:].strip():
+                    continue  # Not an added note, or nothing of it to show yet
+                self.bullets += 1
+                self.bullet = self.bullets
+                part = stripped[1:].lstrip()
+            if part:
+                self.write({"type": "token", "bullet": self.bullet, "text": part,
+                            "spoken_at": self.spoken_at, "requested_at": self.requested_at})
+                visible = True
+        return visible
+
+    def notes(self, notes):
+        self.write({"type": "notes", "notes": notes})
+        self.begin(None, None)
+
+    def close(self):
+        self.file.close()
@@ -1,6 +1,7 @@
-from groq import Groq
+from llmclient import shared_client
 import json
-import os
+import threading
+import time
 
 def create_appointment(date):
     return json.dumps({
@@ -15,42 +16,135 @@ def create_prescription(medication):
     })
 
 class GroqClient:
-    def __init__(self):
-        self.client = Groq(api_key=os.getenv('GROQ_API_KEY'))
+    def __init__(self, llm=None, cache=None):
+        # Every GroqClient shares one rate-limited, retrying LLMClient unless given its own
+        self.llm = llm or shared_client()
         self.model = 'llama3-8b-8192'
+        # Optional responsecache.ResponseCache for calls whose answer depends only on
+        # their input: "nothing new" note updates, bullet summaries and rag answers
+        self.cache = cache
+        # Token usage over all requests, as reported by the API
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.requests = 0
+        self.usage_lock = threading.Lock()
 
-    def summarize(self, text):
+    def record_usage(self, response):
+        usage = getattr(response, "usage", None)
+        with self.usage_lock:
+            self.requests += 1
+            if usage is not None:
+                self.prompt_tokens += usage.prompt_tokens or 0
+                self.completion_tokens += usage.completion_tokens or 0
+
+    def usage(self):
+        with self.usage_lock:
+            return {"requests": self.requests, "prompt_tokens": self.prompt_tokens,
+                    "completion_tokens": self.completion_tokens}
+
+    def cached_completion(self, template, text, similar=False, **request):
+        # Chat completion through the response cache. template is everything in
+        # the request besides text, so the cache key changes whenever it does.
+        # Lookups are exact unless similar is set.
+        if self.cache is not None:
+            content = self.cache.get(self.model, template, text, similar)
+            if content is not None:
+                return content
+        start = time.perf_counter()
+        response = self.llm.complete(model=self.model, **request)
+        self.record_usage(response)
+        content = response.choices[0].message.content
+        if self.cache is not None and content is not None:
+            self.cache.put(self.model, template, text, content, time.perf_counter() - start)
+        return content
+
+    def update_notes(self, notes, transcript, max_notes=30, on_delta=None):
+        # Rolling summarization: only the current notes and the newest transcript
+        # are sent, and the reply is a diff against the notes (see rollingsummarizer).
+        # With on_delta the reply is streamed and on_delta(text) called as it arrives.
+        numbered = "\n".join(f"{i}. {note}" for i, note in enumerate(notes, 1)) or "(none)"
+        system = ("You are a helpful medical assistant keeping running notes of a conversation between a doctor and a patient. You will be given the current numbered notes and the newest part of the transcript. Record symptoms, diagnoses, prescriptions, appointment schedulings and other relevant medical information. "
+                  f"Reply only with changes to the notes, one per line: '+ <note>' adds a note, '~ <number> <note>' rewrites a note, '- <number>' removes a note. Keep every note to a few words, merge related notes and keep at most {max_notes} notes. If nothing new and relevant was said, reply with nothing.")
         messages = [
-            {"role": "system", "content": "You are a helpful medical assistant. You will be given transcription of a conversation between a doctor and a patient. Concisely summarize relevant information such as symptoms, prescriptions, appointment schedulings, etc. in a very short single bullet point. If there is no important medical information, do not respond anything at all. If there is no conversation transcript, also do not respond anything at all."},
-            {"role": "user", "content": text}
+            {"role": "system", "content": system},
+            {"role": "user", "content": f"Notes:\n{numbered}\n\nTranscript:\n{transcript}"}
         ]
+        # Filler ("uh huh", "okay, okay") repeats while the notes stay the same, so
+        # "nothing new" replies are cached and looked up by similarity. Only empty
+        # replies are stored: a near match can skip an utterance but never write a note.
+        template = f"{system}\0{numbered}"
+        if self.cache is not None:
+            cached = self.cache.get(self.model, template, transcript)
+            if cached is not None:
+                return cached
+        start = time.perf_counter()
+        request = dict(
+            messages=messages,
+            model=self.model,
+            max_tokens=512,
+            temperature=0.2,
+            top_p=1
+        )
+
+        if on_delta is None:
+            response = self.llm.complete(**request)
+            self.record_usage(response)
+            content = response.choices[0].message.content or ""
+            self.cache_no_change(template, transcript, content, start)
+            return content
+
+        content = []
+        usage = None
+        for chunk in self.llm.stream(**request):
+            if chunk.choices and chunk.choices[0].delta.content:
+                content.append(chunk.choices[0].delta.content)
+                on_delta(content[-1])
+            if chunk.x_groq is not None and chunk.x_groq.usage is not None:
+                usage = chunk.x_groq  # Usage arrives with the last chunk
+        self.record_usage(usage)
+        content = "".join(content)
+        self.cache_no_change(template, transcript, content, start)
+        return content
+
+    def cache_no_change(self, template, transcript, content, start):
+        if self.cache is not None and not content.strip():
+            self.cache.put(self.model, template, transcript, "", time.perf_counter() - start)
 
-        response = self.client.chat.completions.create(
+    def consolidate_notes(self, notes, max_notes):
+        # Asked when the notes outgrow their cap; the reply is a diff as in update_notes
+        numbered = "\n".join(f"{i}. {note}" for i, note in enumerate(notes, 1))
+        messages = [
+            {"role": "system", "content": "You are a helpful medical assistant keeping running notes of a conversation between a doctor and a patient. There are too many notes. "
+                                          f"Merge related and repeated notes so that at most {max_notes} remain, keeping every symptom, diagnosis, prescription and appointment. Reply only with changes to the notes, one per line: '~ <number> <note>' rewrites a note, '- <number>' removes a note."},
+            {"role": "user", "content": f"Notes:\n{numbered}"}
+        ]
+        response = self.llm.complete(
             messages=messages,
             model=self.model,
             max_tokens=1024,
             temperature=0.2,
             top_p=1
         )
+        self.record_usage(response)
+        return response.choices[0].message.content or ""
 
-        return response.choices[0].message.content
-    
     def summarize_bullets(self, text):
+        system = "You are a helpful medical assistant. Summarize the given bullet points taken during a doctor's appointment into a single paragraph for the doctor to refer to later."
         messages = [
-            {"role": "system", "content": "You are a helpful medical assistant. Summarize the given bullet points taken during a doctor's appointment into a single paragraph for the doctor to refer to later."},
+            {"role": "system", "content": system},
             {"role": "user", "content": text}
         ]
 
-        response = self.client.chat.completions.create(
+        # Exact lookups only: notes that differ slightly can differ in what matters
+        return self.cached_completion(
+            system,
+            text,
             messages=messages,
-            model=self.model,
             max_tokens=1024,
             temperature=0.5,
             top_p=1
         )
 
-        return response.choices[0].message.content
-
     def process_summary(self, summary):
         messages = [
             {"role": "system", "content": "You are a multi-function calling LLM that helps with creating appointments and prescriptions based on a medical summary."},
@@ -93,13 +187,14 @@ class GroqClient:
             }
         ]
 
-        response = self.client.chat.completions.create(
+        response = self.llm.complete(
             model=self.model,
             messages=messages,
             tools=tools,
             tool_choice="auto",
             max_tokens=1024
         )
+        self.record_usage(response)
 
         response_message = response.choices[0].message
         print(response_message)
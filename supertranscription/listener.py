@@ -1,13 +1,18 @@
 from audiorecorder import AudioRecorder
 from groqclient import GroqClient
+from responsecache import ResponseCache
 from realtimeprocessor import RealTimeProcessor
+import os
 import threading
 
 class Listener:
     def __init__(self):
         self.audio_recorder = AudioRecorder()
-        self.groq_client = GroqClient()
-        self.real_time_processor = RealTimeProcessor(self.audio_recorder, self.groq_client)
+        # Filler that produced no note changes is answered from the cache (see GroqClient.update_notes)
+        self.groq_client = GroqClient(cache=ResponseCache(similarity=0.9))
+        # Set AUDIO_DEBUG_DIR to keep a WAV of every transcribed chunk
+        self.real_time_processor = RealTimeProcessor(self.audio_recorder, self.groq_client,
+                                                     debug_dir=os.getenv("AUDIO_DEBUG_DIR"))
         self.recording_thread = threading.Thread(target=self.audio_recorder.start_recording)
 
     def start(self):
@@ -26,15 +31,11 @@ class Listener:
         transcript = self.real_time_processor.transcript_manager.get_transcript()
         print("Transcript:", transcript)
 
-        bullets_path = "summary.txt"
-        
-        with open(bullets_path, 'r') as file:
-            bullet_points = file.read()
-
-        # Generate paragraph summary from transcript
+        # The running notes are already bounded, so this does not re-read the visit
         print("Summarizing the entire conversation...")
-        paragraph_summary = self.groq_client.summarize_bullets(bullet_points)
+        paragraph_summary = self.real_time_processor.summarizer.final_summary()
         print("Paragraph Summary:", paragraph_summary)
+        self.real_time_processor.write_summary(self.real_time_processor.summarizer.get_notes(), paragraph_summary)
 
         # Process the paragraph summary to create appointments and prescriptions
         print("Processing paragraph summary to create appointments and prescriptions...")
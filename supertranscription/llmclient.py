@@ -0,0 +1,210 @@
+import asyncio
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+# One chat-completions client shared by every GroqClient in the process.
+# Requests run on a single asyncio loop in a background thread, over one
+# pooled HTTP connection set, so threads (transcription workers, several
+# rooms) no longer each block on their own connection. Each request:
+#   - waits for the request and token buckets (the account's per-minute limits)
+#   - joins an identical request already in flight instead of sending it again
+#   - retries 429s, timeouts, connection errors and 5xx with jittered
+#     exponential backoff, honouring retry-after; a 429 pauses every request
+# Point GROQ_BASE_URL at mockllmserver.py to run without the real API.
+
+class TokenBucket:
+    # Refills at per_minute / 60 per second up to burst. acquire() waits in
+    # arrival order; amounts larger than burst are clamped so they still pass.
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1.0, per_minute / 4)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = None  # Created on the loop that uses it
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1.0):
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            self.refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= amount
+
+    def refund(self, amount):
+        # Gives back an overestimate once the real usage is known
+        self.refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+def estimate_tokens(request):
+    # Rough prompt size (4 characters per token) plus the completion budget
+    characters = sum(len(message.get("content") or "") for message in request.get("messages", []))
+    return characters // 4 + request.get("max_tokens", 1024)
+
+def retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class LLMClient:
+    def __init__(self, api_key=None, base_url=None, requests_per_minute=30, tokens_per_minute=30000,
+                 max_connections=10, timeout=30.0, max_retries=5, base_delay=0.5, max_delay=20.0):
+        self.api_key = api_key or os.getenv('GROQ_API_KEY')
+        self.base_url = base_url  # None: GROQ_BASE_URL, then the Groq API
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+        self.inflight = {}
+        self.latencies = deque(maxlen=1000)
+        self.counts = {"requests": 0, "sent": 0, "coalesced": 0, "retries": 0, "rate_limited": 0, "failed": 0}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-client", daemon=True)
+        self.thread.start()
+        self.client = self.run(self.open_client())
+
+    async def open_client(self):
+        import httpx
+        import groq
+        self.groq = groq
+        self.retryable = (groq.RateLimitError, groq.APITimeoutError, groq.APIConnectionError, groq.InternalServerError)
+        http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=self.max_connections,
+                                                            max_keepalive_connections=self.max_connections),
+                                        timeout=self.timeout)
+        # The SDK's own retries are off; create() below does them with the shared limits
+        return groq.AsyncGroq(api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                              timeout=self.timeout, http_client=http_client)
+
+    def run(self, coroutine, timeout=None):
+        # Runs a coroutine on the client's loop from any other thread and waits for it
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def complete(self, **request):
+        # Blocking chat completion for threaded callers; the arguments are those
+        # of client.chat.completions.create
+        return self.run(self.create(**request))
+
+    def stream(self, **request):
+        # Blocking iterator over the chunks of a streamed completion, for threaded
+        # callers. Streams are never coalesced; errors are raised after the last chunk.
+        chunks = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self.send(request, chunks.put), self.loop)
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            yield chunk
+        future.result()
+
+    async def create(self, **request):
+        self.counts["requests"] += 1
+        key = json.dumps(request, sort_keys=True, default=str)
+        future = self.inflight.get(key)
+        if future is not None:
+            self.counts["coalesced"] += 1
+        else:
+            future = asyncio.ensure_future(self.send(request))
+            self.inflight[key] = future
+            future.add_done_callback(lambda _: self.inflight.pop(key, None))
+        # shield: one caller giving up does not cancel the request for the others
+        return await asyncio.shield(future)
+
+    async def send(self, request, emit=None):
+        # With emit, the completion is streamed and each chunk passed to it, then None
+        if emit is not None:
+            self.counts["requests"] += 1  # create() counts the others
+        try:
+            return await self.send_with_retries(request, emit)
+        finally:
+            if emit is not None:
+                emit(None)
+
+    async def send_with_retries(self, request, emit):
+        estimate = estimate_tokens(request)
+        for attempt in range(self.max_retries + 1):
+            await self.request_bucket.acquire()
+            await self.token_bucket.acquire(estimate)
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            start = time.perf_counter()
+            self.counts["sent"] += 1
+            emitted = False
+            try:
+                if emit is None:
+                    response = await self.client.chat.completions.create(**request)
+                    usage = response.usage
+                else:
+                    response = usage = None
+                    async for chunk in await self.client.chat.completions.create(stream=True, **request):
+                        emitted = True
+                        emit(chunk)
+                        if chunk.x_groq is not None and chunk.x_groq.usage is not None:
+                            usage = chunk.x_groq.usage
+            except self.retryable as e:
+                # Part of a stream may already be on screen, so it is not sent again
+                if attempt == self.max_retries or emitted:
+                    self.counts["failed"] += 1
+                    raise
+                self.counts["retries"] += 1
+                # Full jitter, so clients that failed together do not retry together
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if isinstance(e, self.groq.RateLimitError):
+                    self.counts["rate_limited"] += 1
+                    delay = max(delay, retry_after(e) or 0.0)
+                    self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                await asyncio.sleep(delay)
+                continue
+            except Exception:
+                self.counts["failed"] += 1
+                raise
+            self.latencies.append(time.perf_counter() - start)
+            if usage is not None and usage.total_tokens is not None:
+                self.token_bucket.refund(max(0, estimate - usage.total_tokens))
+            return response
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+        def percentile(p):
+            return round(1000 * latencies[min(len(latencies) - 1, int(p * len(latencies)))], 1) if latencies else 0.0
+        return dict(self.counts, inflight=len(self.inflight),
+                    p50_ms=percentile(0.5), p95_ms=percentile(0.95), p99_ms=percentile(0.99))
+
+    def close(self):
+        self.run(self.client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+shared = None
+shared_lock = threading.Lock()
+
+def shared_client():
+    # The process-wide client. Limits come from the environment: GROQ_RPM,
+    # GROQ_TPM and GROQ_MAX_CONNECTIONS (defaults match the free llama3-8b tier).
+    global shared
+    with shared_lock:
+        if shared is None:
+            shared = LLMClient(requests_per_minute=float(os.getenv("GROQ_RPM", 30)),
+                               tokens_per_minute=float(os.getenv("GROQ_TPM", 30000)),
+                               max_connections=int(os.getenv("GROQ_MAX_CONNECTIONS", 10)))
+        return shared
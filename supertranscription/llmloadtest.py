@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from llmclient import LLMClient
+import mockllmserver
+
+# Load test for the shared LLM client: many concurrent rooms sending
+# summarization-sized requests. Runs against mockllmserver.py (started
+# in-process unless --base-url is given) and reports throughput, tail
+# latency, retries, 429s, coalesced requests and connections opened as JSON.
+# Usage: python llmloadtest.py --requests 500 --concurrency 50 --server-rpm 300
+#        python llmloadtest.py --duplicates 0.3 --json load.json
+
+def latency_summary(seconds):
+    ms = sorted(1000 * s for s in seconds)
+    if not ms:
+        return {"mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    def percentile(p):
+        return round(ms[min(len(ms) - 1, int(p * len(ms)))], 1)
+    return {"mean_ms": round(sum(ms) / len(ms), 1), "p50_ms": percentile(0.5), "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99), "max_ms": round(ms[-1], 1)}
+
+async def load(client, requests, concurrency, duplicates):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+    async def one(i):
+        nonlocal failures
+        # A share of requests repeat an earlier one, as when rooms resend the same prompt
+        n = random.randrange(max(1, i)) if i and random.random() < duplicates else i
+        messages = [{"role": "system", "content": "Summarize the transcript in one bullet point."},
+                    {"role": "user", "content": f"Transcript {n}: " + "the patient reports a mild headache " * 8}]
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await client.create(messages=messages, model="llama3-8b-8192", max_tokens=64)
+            except Exception as e:
+                failures += 1
+                print(f"Request {i} failed: {e!r}")
+                return
+            latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies, failures, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the shared LLM client against a mock server.")
+    parser.add_argument("--base-url", help="Existing server to test; a mock is started when omitted")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=30)
+    parser.add_argument("--duplicates", type=float, default=0.0, help="Fraction of requests repeating an earlier prompt")
+    parser.add_argument("--rpm", type=float, default=6000, help="Client request budget per minute")
+    parser.add_argument("--tpm", type=float, default=1_000_000, help="Client token budget per minute")
+    parser.add_argument("--max-connections", type=int, default=10)
+    parser.add_argument("--server-rpm", type=int, default=0, help="Mock server limit before 429s (0 for none)")
+    parser.add_argument("--server-latency-ms", type=float, default=300.0)
+    parser.add_argument("--server-error-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server, base_url = mockllmserver.serve(latency_ms=args.server_latency_ms, rpm=args.server_rpm,
+                                               error_rate=args.server_error_rate)
+    client = LLMClient(api_key="mock", base_url=base_url, requests_per_minute=args.rpm,
+                       tokens_per_minute=args.tpm, max_connections=args.max_connections)
+    latencies, failures, elapsed = client.run(load(client, args.requests, args.concurrency, args.duplicates))
+    results = {
+        "base_url": base_url,
+        "config": {"requests": args.requests, "concurrency": args.concurrency, "duplicates": args.duplicates,
+                   "rpm": args.rpm, "tpm": args.tpm, "max_connections": args.max_connections},
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "failures": failures,
+        "latency": latency_summary(latencies),
+        "client": client.metrics(),
+    }
+    if server is not None:
+        results["server"] = dict(server.counts)
+        server.shutdown()
+    client.close()
+
+    print(f"{len(latencies)} requests in {results['elapsed_s']}s: {results['throughput_rps']} req/s, "
+          f"p50 {results['latency']['p50_ms']}ms, p95 {results['latency']['p95_ms']}ms, "
+          f"p99 {results['latency']['p99_ms']}ms, {failures} failed")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the Groq chat-completions endpoint, for load tests that
+# should not touch the real API. Replies after a random latency, enforces a
+# requests-per-minute limit with 429 + retry-after like the real service,
+# and can fail a fraction of requests with 500s. Streamed requests get
+# server-sent-event chunks, one word every token_ms after the first.
+# Usage: python mockllmserver.py --port 8099 --rpm 600
+#        GROQ_BASE_URL=http://127.0.0.1:8099 python listener.py
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=300.0, jitter_ms=100.0, rpm=600, error_rate=0.0, token_ms=20.0):
+        super().__init__(address, MockLLMHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.token_ms = token_ms
+        self.recent = deque()  # Times of accepted requests in the last minute
+        self.lock = threading.Lock()
+        self.counts = {"connections": 0, "requests": 0, "rate_limited": 0, "errors": 0}
+
+    def admit(self):
+        # Returns 0 if the request is within the limit, else seconds until it would be
+        now = time.monotonic()
+        with self.lock:
+            self.counts["requests"] += 1
+            while self.recent and now - self.recent[0] >= 60:
+                self.recent.popleft()
+            if self.rpm and len(self.recent) >= self.rpm:
+                self.counts["rate_limited"] += 1
+                return 60 - (now - self.recent[0])
+            self.recent.append(now)
+            return 0
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so client connection pooling shows up in the counts
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.counts["connections"] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=()):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        wait = self.server.admit()
+        if wait:
+            self.send_json(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                           [("retry-after", f"{wait:.2f}")])
+            return
+        time.sleep(max(0.0, random.gauss(self.server.latency_ms, self.server.jitter_ms)) / 1000)
+        if random.random() < self.server.error_rate:
+            with self.server.lock:
+                self.server.counts["errors"] += 1
+            self.send_json(500, {"error": {"message": "Mock internal error"}})
+            return
+        prompt = " ".join(message.get("content") or "" for message in request.get("messages", []))
+        content = f"Mock reply to: {prompt[-40:]}"
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        if request.get("stream"):
+            self.send_stream(request, content, usage)
+            return
+        self.send_json(200, {
+            "id": f"chatcmpl-mock-{time.time_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def send_stream(self, request, content, usage):
+        # Chunked transfer encoding keeps the connection reusable after the stream
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        def send_event(data):
+            event = f"data: {data}\n\n".encode()
+            self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            self.wfile.flush()
+        chunk_id, created = f"chatcmpl-mock-{time.time_ns()}", int(time.time())
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.server.token_ms / 1000)
+            last = i == len(words) - 1
+            send_event(json.dumps({
+                "id": chunk_id, "object": "chat.completion.chunk", "created": created,
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word},
+                             "finish_reason": "stop" if last else None}],
+                **({"x_groq": {"id": chunk_id, "usage": usage}} if last else {}),
+            }))
+        send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+def serve(port=0, **kwargs):
+    # Starts the server on a background thread; returns it and its base URL
+    server = MockLLMServer(("127.0.0.1", port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock Groq chat-completions endpoint.")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--rpm", type=int, default=600, help="Requests per minute before 429s (0 for no limit)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--token-ms", type=float, default=20.0, help="Delay between streamed words")
+    args = parser.parse_args()
+    server = MockLLMServer(("127.0.0.1", args.port), args.latency_ms, args.jitter_ms, args.rpm, args.error_rate,
+                           args.token_ms)
+    print(f"Mock LLM server on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
-import os
 import gspread
-import json
 from dotenv import load_dotenv
 from oauth2client.service_account import ServiceAccountCredentials
-from groq import Groq
+import groqclient
+from responsecache import ResponseCache
+from retrieval import PatientHistory
 
 load_dotenv()
 
@@ -29,15 +29,15 @@ def load_data_from_sheets():
         "conditions": sheet.cell(2, 8).value.split(', '),
         "appointments": [
             {
-                "date": line.split(": ")[0],
-                "summary": line.split(": ")
+                "date": line.partition(": ")[0],
+                "summary": line.partition(": ")[2]
             }
             for line in sheet.cell(2, 9).value.split('\n')
         ],
         "emotional_states": [
             {
-                "date": line.split(": ")[0],
-                "emotion": line.split(": ")[1]
+                "date": line.partition(": ")[0],
+                "emotion": line.partition(": ")[2]
             }
             for line in sheet.cell(2, 10).value.split('\n')
         ]
@@ -45,39 +45,41 @@ def load_data_from_sheets():
     return data
 
 # Initialize GroqClient
-class GroqClient:
-    def __init__(self):
-        self.client = Groq(api_key=os.getenv('GROQ_API_KEY'))
-        self.model = 'llama3-8b-8192'
-    
+class GroqClient(groqclient.GroqClient):
     def answer_question(self, context, question):
+        system = "You are a helpful assistant."
         messages = [
-            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "system", "content": system},
             {"role": "user", "content": f"Context: {context}"},
             {"role": "user", "content": f"Question: {question}"}
         ]
         
-        response = self.client.chat.completions.create(
+        # Repeated questions against unchanged context are answered from the cache
+        answer = self.cached_completion(
+            f"{system}\0{context}",
+            question,
             messages=messages,
-            model=self.model,
             max_tokens=150,
             temperature=0.7,
             top_p=1
         )
         
-        return response.choices[0].message.content.strip()
+        return answer.strip()
 
 if __name__ == "__main__":
     data = load_data_from_sheets()
-    groq_client = GroqClient()
+    groq_client = GroqClient(cache=ResponseCache())
     
-    context = json.dumps(data, indent=2)
-    print("Data loaded from Google Sheets into GroqClient context.")
-    print(context)
+    # Only the core facts and the history chunks relevant to each question are sent
+    history = PatientHistory(data)
+    print("Data loaded from Google Sheets and indexed for retrieval.")
+    print(f"{len(history.index.chunks)} history chunks.")
+    print(history.core)
     
     while True:
         question = input("Ask a question about the data (or type 'exit' to quit): ")
         if question.lower() == 'exit':
             break
-        answer = groq_client.answer_question(context, question)
+        answer = groq_client.answer_question(history.context(question), question)
         print("Answer:", answer)
+    print(groq_client.cache.stats())
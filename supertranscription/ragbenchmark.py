@@ -0,0 +1,151 @@
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+from llmclient import estimate_tokens
+from retrieval import PatientHistory, create_embedder
+
+# Prompt size and latency of answering questions about a patient as their
+# history grows: the old approach (the whole record as JSON in every prompt)
+# against retrieval (core facts plus the top-k history chunks). Histories are
+# synthetic, with planted prescriptions whose questions measure recall@k.
+# Usage: python ragbenchmark.py --sizes 10 100 1000 --embedder hashing
+#        GROQ_BASE_URL=http://127.0.0.1:8099 python ragbenchmark.py --llm
+
+CONTEXT_TOKENS = 8192  # llama3-8b-8192
+FIRST_VISIT = date(2015, 1, 5)  # Then one visit a week
+SYMPTOMS = ["headache", "back pain", "fatigue", "cough", "dizziness", "nausea", "joint stiffness", "insomnia",
+            "shortness of breath", "rash", "sore throat", "fever"]
+MEDICATIONS = ["ibuprofen", "amoxicillin", "lisinopril", "metformin", "sertraline", "omeprazole", "albuterol",
+               "atorvastatin", "cetirizine", "prednisone"]
+EMOTIONS = ["anxious", "calm", "tired", "hopeful", "frustrated", "relieved", "nervous", "cheerful"]
+# Names that appear once, so a retrieved chunk can be checked against the question
+PLANTED = ["zanubrutinib", "vericiguat", "tirzepatide", "lumateperone", "finerenone", "avacopan", "sotorasib",
+           "mavacamten", "inclisiran", "tezepelumab"]
+
+def synthetic_record(visits, rng):
+    appointments, emotional_states = [], []
+    planted = {}
+    plant_at = set(rng.sample(range(visits), min(len(PLANTED), visits)))
+    for i in range(visits):
+        visit_date = (FIRST_VISIT + timedelta(days=7 * i)).isoformat()
+        symptom, other = rng.sample(SYMPTOMS, 2)
+        medication = rng.choice(MEDICATIONS)
+        sentences = [
+            f"Patient reported {symptom} for {rng.randint(2, 14)} days, with occasional {other}.",
+            f"Blood pressure {rng.randint(105, 150)}/{rng.randint(65, 95)}, heart rate {rng.randint(55, 100)}.",
+            f"Discussed sleep, diet and exercise; patient walks {rng.randint(0, 6)} times a week.",
+            f"Continued {medication} at the current dose and reviewed side effects.",
+            f"Advised to return if the {symptom} worsens or new symptoms appear.",
+        ]
+        if i in plant_at:
+            drug = PLANTED[len(planted)]
+            sentences.insert(1, f"Started {drug} for {other} after discussing the options.")
+            planted[drug] = visit_date
+        appointments.append({"date": visit_date, "summary": " ".join(rng.sample(sentences, len(sentences)))})
+        emotional_states.append({"date": visit_date, "emotion": ", ".join(rng.sample(EMOTIONS, 2))})
+    record = {
+        "user": {"name": "sophia", "age": 20, "height": "5'6\"", "weight": "115 lbs", "sex": "Female"},
+        "prescriptions": sorted(set(MEDICATIONS[:4])),
+        "next_appointment": None,
+        "conditions": ["hypertension"],
+        "appointments": appointments,
+        "emotional_states": emotional_states,
+    }
+    return record, planted
+
+def messages_for(context, question):
+    # As rag.GroqClient.answer_question builds them
+    return [{"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": f"Context: {context}"},
+            {"role": "user", "content": f"Question: {question}"}]
+
+def latency_summary(seconds):
+    ms = sorted(1000 * s for s in seconds)
+    if not ms:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    def percentile(p):
+        return round(ms[min(len(ms) - 1, int(p * len(ms)))], 3)
+    return {"p50_ms": percentile(0.5), "p95_ms": percentile(0.95), "max_ms": round(ms[-1], 3)}
+
+def time_answers(llm, contexts, questions):
+    latencies, failures = [], 0
+    for context, question in zip(contexts, questions):
+        start = time.perf_counter()
+        try:
+            llm.complete(messages=messages_for(context, question), model="llama3-8b-8192", max_tokens=150)
+        except Exception as e:
+            failures += 1
+            print(f"Answer failed: {e!r}")
+            continue
+        latencies.append(time.perf_counter() - start)
+    return dict(latency_summary(latencies), failures=failures)
+
+def benchmark(visits, embedder, k, rng, llm=None):
+    record, planted = synthetic_record(visits, rng)
+    questions = [f"When was the patient started on {drug}?" for drug in planted]
+    full_context = json.dumps(record, indent=2)
+
+    start = time.perf_counter()
+    history = PatientHistory(record, embedder=embedder, k=k)
+    build_s = time.perf_counter() - start
+
+    contexts, retrieve_s, found = [], [], 0
+    for drug, question in zip(planted, questions):
+        start = time.perf_counter()
+        context = history.context(question)
+        retrieve_s.append(time.perf_counter() - start)
+        contexts.append(context)
+        found += drug in context
+
+    full_tokens = estimate_tokens({"messages": messages_for(full_context, questions[0]), "max_tokens": 0})
+    retrieval_tokens = [estimate_tokens({"messages": messages_for(context, question), "max_tokens": 0})
+                        for context, question in zip(contexts, questions)]
+    results = {
+        "visits": visits,
+        "chunks": len(history.index.chunks),
+        "full_prompt_tokens": full_tokens,
+        "full_fits_context": full_tokens + 150 <= CONTEXT_TOKENS,
+        "retrieval_prompt_tokens": round(sum(retrieval_tokens) / len(retrieval_tokens)),
+        "index_build_s": round(build_s, 3),
+        "retrieve": latency_summary(retrieve_s),
+        "recall_at_k": round(found / len(questions), 3),
+    }
+    if llm is not None:
+        results["answer_full"] = time_answers(llm, [full_context] * len(questions), questions)
+        results["answer_retrieval"] = time_answers(llm, contexts, questions)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full-record prompts with retrieval as patient history grows.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 1000, 5000], help="Visits in the history")
+    parser.add_argument("--embedder", default=None, help="minilm or hashing (default $RAG_EMBEDDER, then minilm)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm", action="store_true", help="Also time real answers through the shared LLM client")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    embedder = create_embedder(args.embedder)
+    llm = None
+    if args.llm:
+        from llmclient import shared_client
+        llm = shared_client()
+    results = []
+    for visits in args.sizes:
+        result = benchmark(visits, embedder, args.k, random.Random(args.seed), llm)
+        results.append(result)
+        print(f"{visits:>6} visits: full prompt {result['full_prompt_tokens']:>8} tokens"
+              f"{'' if result['full_fits_context'] else ' (over context)'}, retrieval {result['retrieval_prompt_tokens']:>5} tokens, "
+              f"retrieve p50 {result['retrieve']['p50_ms']}ms, recall@{args.k} {result['recall_at_k']}, "
+              f"index built in {result['index_build_s']}s")
+
+    results = {"embedder": embedder.name, "k": args.k, "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,214 @@
-import speech_recognition as sr
 from transcriptmanager import TranscriptManager
+from asrbackends import create_backend, TranscriptionError
+from vad import VoiceActivityDetector
+from segmentpipeline import SegmentQueue, ResultSequencer, StageStats
+from rollingsummarizer import RollingSummarizer
+from displayfeed import DisplayFeed
+import itertools
+import os
 import time
 import wave
 import threading
 
 class RealTimeProcessor:
-    def __init__(self, audio_recorder, groq_client):
+    def __init__(self, audio_recorder, groq_client, debug_dir=None, vad=None, poll_interval=0.05,
+                 transcribe_workers=2, queue_size=4, backpressure="block", stats_interval=30.0,
+                 asr_backend=None, on_partial=None, summarizer=None, display_feed=None):
         self.audio_recorder = audio_recorder
-        self.speech_recognizer = sr.Recognizer()
+        # Audio is cut into utterances by voice activity; silence never reaches
+        # speech recognition or the LLM
+        self.vad = vad or VoiceActivityDetector(audio_recorder.rate * audio_recorder.channels)
+        self.poll_interval = poll_interval
+        # When set, every chunk is also saved as a WAV under debug_dir for inspection
+        self.debug_dir = debug_dir
+        self.debug_ids = itertools.count()
+        # asrbackends backend; $ASR_BACKEND picks one (google, vosk, whisper) when not given.
+        # Streaming backends are fed while the utterance is still being spoken, so the
+        # text is ready as soon as it ends and partial hypotheses go to on_partial.
+        self.asr = asr_backend or create_backend()
+        self.on_partial = on_partial or (lambda text: print(f"... {text}"))
+        self.stream = None
+        self.stream_position = None
+        self.transcription_failures = 0
         self.groq_client = groq_client
         self.running = False
         self.transcript_manager = TranscriptManager()
+        # Utterances are transcribed by a worker pool, so the recognition calls for
+        # successive utterances overlap, then handed in utterance order to the
+        # rolling summarizer, which updates the visit notes a few utterances at a
+        # time on its own thread. backpressure ("block", "drop" or "merge")
+        # decides what happens when utterances arrive faster than they are transcribed.
+        self.transcribe_workers = transcribe_workers
+        self.stats_interval = stats_interval
+        self.sequencer = ResultSequencer(self.write_result)
+        self.segment_queue = SegmentQueue("transcribe", queue_size, backpressure,
+                                          on_drop=lambda segment: self.sequencer.complete(segment["seq"], None))
+        self.summarizer = summarizer or RollingSummarizer(groq_client)
+        self.summarizer.on_update = self.write_notes
+        # Notes are streamed to the AR display token by token as the summarizer writes them
+        self.display_feed = display_feed or DisplayFeed()
+        self.display_batch = None
+        self.summarizer.on_delta = self.stream_to_display
+        self.stats = {name: StageStats(name) for name in ("stream", "transcribe", "speech_to_first_token", "end_to_end")}
+        self.seqs = itertools.count()
 
     def process_audio(self):
+        last_report = time.perf_counter()
         while self.running:
-            chunk = self.audio_recorder.get_chunk()
-            if chunk:
-                audio_file = self.save_chunk_to_file(chunk)
-                text = self.transcribe_audio(audio_file)
-                if text:
-                    summary = self.groq_client.summarize(text)
-                    self.append_to_file(summary)
-                    self.transcript_manager.add_to_transcript(text)
-            time.sleep(3)  # Process every 3 seconds
-
-    def save_chunk_to_file(self, chunk):
-        filename = 'temp_chunk.wav'
+            self.process_new_audio()
+            if time.perf_counter() - last_report > self.stats_interval:
+                self.print_stats()
+                last_report = time.perf_counter()
+            time.sleep(self.poll_interval)
+        # Recording has stopped: handle what is left, including an unfinished utterance
+        self.process_new_audio(flush=True)
+
+    def process_new_audio(self, flush=False):
+        view, position = self.audio_recorder.read_new_at()
+        segments = self.vad.feed(view, position)
+        if flush:
+            segments += self.vad.flush()
+        if not self.asr.streaming:
+            for start, end in segments:
+                self.enqueue_segment(start, end)
+            return
+        for start, end in segments:
+            text = self.stream_audio(start, end, finish=True)
+            self.enqueue_segment(start, end, text)
+        active = self.vad.active_start()
+        if active is not None:
+            partial = self.stream_audio(active, position + len(view))
+            if partial:
+                self.on_partial(partial)
+
+    def stream_audio(self, start, end, finish=False):
+        # Feeds [start, end) of the current utterance to the streaming session,
+        # skipping what it already has (which may run a little past a finished
+        # utterance's padded end; that is only silence). Returns the partial
+        # text, or the final text when finish is set (None if transcription failed).
+        started = time.perf_counter()
+        try:
+            if self.stream is None:
+                self.stream = self.asr.start_stream(self.audio_recorder.rate)
+                self.stream_position = start
+            if end > self.stream_position:
+                result = self.stream.accept(self.audio_recorder.read_range(self.stream_position, end))
+                self.stream_position = end
+            else:
+                result = None
+            if finish:
+                self.stream, stream = None, self.stream
+                result = stream.finish()
+        except TranscriptionError as e:
+            self.stream = None
+            self.transcription_failures += 1
+            print(f"Transcription failed: {e}")
+            return None
+        self.stats["stream"].record(time.perf_counter() - started)
+        return result
+
+    def enqueue_segment(self, start, end, text=None):
+        # Copied out of the ring buffer since the segment may wait in the queue
+        segment = {"audio": self.audio_recorder.read_range(start, end), "queued_at": time.perf_counter(),
+                   "ended_at": time.time()}
+        if self.asr.streaming:
+            segment["text"] = text  # Already transcribed while it was being spoken
+        segment["seq"] = next(self.seqs)
+        if not self.segment_queue.put(segment):
+            # Merged into the previous segment, whose sequence number it now shares
+            self.seqs = itertools.count(segment["seq"])
+
+    def transcribe_loop(self):
+        while not self.segment_queue.drained():
+            segment = self.segment_queue.get()
+            if segment is None:
+                continue
+            if self.debug_dir:
+                self.dump_chunk(segment["audio"])
+            if "text" not in segment:
+                start = time.perf_counter()
+                segment["text"] = self.transcribe_audio(segment["audio"])
+                self.stats["transcribe"].record(time.perf_counter() - start)
+            self.sequencer.complete(segment["seq"], segment if segment["text"] else None)
+
+    def write_result(self, segment):
+        # Called in sequence order, one segment at a time
+        self.transcript_manager.add_to_transcript(segment["text"])
+        self.summarizer.add(segment)
+
+    def stream_to_display(self, batch, text):
+        # Runs on the summarizer thread, one batch at a time
+        if batch is not self.display_batch:
+            self.display_batch = batch
+            self.display_feed.begin(batch[0]["ended_at"], batch[0]["requested_at"])
+            self.first_visible = False
+        if self.display_feed.delta(text) and not self.first_visible:
+            self.first_visible = True
+            self.stats["speech_to_first_token"].record(time.time() - batch[0]["ended_at"])
+
+    def write_notes(self, notes, changes, batch):
+        # The notes are small, so summary.txt is rewritten whole and always matches them
+        for op, number, text in changes:
+            print(f"{op} {text}" if number is None else f"{op} {number}. {text}")
+        self.write_summary(notes)
+        self.display_feed.notes(notes)
+        self.display_batch = None
+        now = time.perf_counter()
+        for segment in batch:
+            self.stats["end_to_end"].record(now - segment["queued_at"])
+
+    def dump_chunk(self, pcm):
+        os.makedirs(self.debug_dir, exist_ok=True)
+        filename = os.path.join(self.debug_dir, f"chunk_{os.getpid()}_{time.strftime('%Y%m%d-%H%M%S')}_{next(self.debug_ids)}.wav")
         with wave.open(filename, 'wb') as wf:
             wf.setnchannels(self.audio_recorder.channels)
             wf.setsampwidth(self.audio_recorder.p.get_sample_size(self.audio_recorder.sample_format))
             wf.setframerate(self.audio_recorder.rate)
-            wf.writeframes(chunk)
+            wf.writeframes(pcm)
         return filename
 
-    def transcribe_audio(self, audio_file):
-        with sr.AudioFile(audio_file) as source:
-            audio = self.speech_recognizer.record(source)
-            try:
-                return self.speech_recognizer.recognize_google(audio)
-            except sr.UnknownValueError:
-                return None
-            except sr.RequestError as e:
-                return None
+    def transcribe_audio(self, pcm):
+        try:
+            return self.asr.transcribe(pcm, self.audio_recorder.rate)
+        except TranscriptionError as e:
+            self.transcription_failures += 1
+            print(f"Transcription failed: {e}")
+            return None
+
+    def write_summary(self, notes, paragraph=None, filename="summary.txt"):
+        # The running notes, and once the visit is over its paragraph summary after them
+        with open(filename + ".tmp", "w") as f:
+            f.writelines(f"• {note}\n" for note in notes)
+            if paragraph:
+                f.write(f"\n{paragraph}\n")
+        os.replace(filename + ".tmp", filename)
+
+    def metrics(self):
+        return {"stages": [stats.summary() for stats in self.stats.values()],
+                "queues": [self.segment_queue.summary()],
+                "summarizer": self.summarizer.metrics(),
+                "waiting_for_order": self.sequencer.waiting(),
+                "asr_backend": self.asr.name,
+                "transcription_failures": self.transcription_failures}
 
-    def append_to_file(self, summary):
-        with open("summary.txt", "a") as f:
-            f.write(f"• {summary}\n")
+    def print_stats(self):
+        print(self.metrics())
 
     def start(self):
         self.running = True
         self.thread = threading.Thread(target=self.process_audio)
-        self.thread.start()
+        self.transcribe_threads = [threading.Thread(target=self.transcribe_loop) for _ in range(self.transcribe_workers)]
+        self.summarizer.start()
+        for thread in [self.thread] + self.transcribe_threads:
+            thread.start()
 
     def stop(self):
+        # Stop capturing, then let transcription and summarization finish what is already queued
         self.running = False
         self.thread.join()
+        self.segment_queue.close()
+        for thread in self.transcribe_threads:
+            thread.join()
+        self.summarizer.stop()
+        self.display_feed.close()
+        self.print_stats()
@@ -0,0 +1,184 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+
+def normalize(text):
+    # Case, punctuation and spacing do not change what the model is asked.
+    # Words in any script are kept, so "她在吃什么药" does not normalize to "".
+    return " ".join(re.findall(r"[\w']+", text.casefold()))
+
+def ngram_vector(text, dim=256):
+    # Cheap embedding for near-duplicate detection: hashed character trigrams,
+    # L2-normalized. "uh huh" and "uh-huh, uh huh" land close together; it
+    # knows nothing about meaning, so pass a real embedder for paraphrases.
+    vector = np.zeros(dim, dtype=np.float32)
+    padded = f"  {text} "
+    for i in range(len(padded) - 2):
+        vector[int.from_bytes(hashlib.blake2b(padded[i:i+3].encode(), digest_size=4).digest(), "little") % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class ResponseCache:
+    # LLM responses in a SQLite file, keyed on (model, prompt template,
+    # normalized input). template is everything in the prompt besides the
+    # input (system prompt, context), so editing either never returns a stale
+    # answer. Entries expire after ttl seconds and are evicted least recently
+    # used beyond max_entries.
+    # With similarity set, an exact miss falls back to the most similar cached
+    # input for the same model and template, accepted at cosine >= similarity;
+    # embed(text) -> vector defaults to ngram_vector.
+    # Inputs that normalize to nothing (only punctuation or symbols) would all
+    # share one key, so they are never cached: get() skips them and put() ignores them.
+    def __init__(self, path="llm_cache.sqlite", max_entries=10_000, ttl=24 * 3600, similarity=None, embed=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.embed = embed or ngram_vector
+        self.counts = {"hits": 0, "similar_hits": 0, "misses": 0, "skipped": 0, "expired": 0, "evicted": 0}
+        self.saved_seconds = 0.0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS responses (
+                    key BLOB PRIMARY KEY,
+                    namespace BLOB,
+                    response TEXT,
+                    vector BLOB,
+                    latency REAL,
+                    created REAL,
+                    last_used INTEGER
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+            self.conn.execute('DELETE FROM responses WHERE created < ?', (time.time() - self.ttl,))
+        # Access counter for LRU order, as in facecv's EmbeddingCache
+        self.clock = self.conn.execute('SELECT COALESCE(MAX(last_used), 0) FROM responses').fetchone()[0]
+        self.size = self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        # namespace -> {key: vector}, and the stacked (keys, matrix) built from it on demand
+        self.vectors = {}
+        self.matrices = {}
+        if self.similarity is not None:
+            for key, namespace, vector in self.conn.execute(
+                    'SELECT key, namespace, vector FROM responses WHERE vector IS NOT NULL'):
+                self.vectors.setdefault(namespace, {})[key] = np.frombuffer(vector, dtype=np.float32)
+
+    def namespace(self, model, template):
+        return hashlib.blake2b(f"{model}\0{template}".encode(), digest_size=16).digest()
+
+    def key(self, namespace, text):
+        return hashlib.blake2b(namespace + normalize(text).encode(), digest_size=20).digest()
+
+    def tick(self):
+        self.clock += 1
+        return self.clock
+
+    def get(self, model, template, text, similar=True):
+        # The cached response, or None. similar=False keeps this lookup exact
+        # even when the cache has similarity set.
+        if not normalize(text):
+            with self.lock:
+                self.counts["skipped"] += 1
+            return None
+        namespace = self.namespace(model, template)
+        key = self.key(namespace, text)
+        with self.lock:
+            response = self.lookup(key)
+            if response is not None:
+                self.counts["hits"] += 1
+                return response
+            if similar and self.similarity is not None:
+                key = self.nearest(namespace, text)
+                response = self.lookup(key) if key is not None else None
+                if response is not None:
+                    self.counts["similar_hits"] += 1
+                    return response
+            self.counts["misses"] += 1
+            return None
+
+    def lookup(self, key):
+        row = self.conn.execute('SELECT response, latency, created FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        response, latency, created = row
+        if created < time.time() - self.ttl:
+            self.counts["expired"] += 1
+            self.delete([key])
+            return None
+        with self.conn:
+            self.conn.execute('UPDATE responses SET last_used = ? WHERE key = ?', (self.tick(), key))
+        self.saved_seconds += latency
+        return response
+
+    def nearest(self, namespace, text):
+        if namespace not in self.matrices:
+            vectors = self.vectors.get(namespace)
+            if not vectors:
+                return None
+            self.matrices[namespace] = (list(vectors), np.stack(list(vectors.values())))
+        keys, matrix = self.matrices[namespace]
+        scores = matrix @ self.embed(normalize(text))
+        best = int(np.argmax(scores))
+        return keys[best] if scores[best] >= self.similarity else None
+
+    def put(self, model, template, text, response, latency=0.0):
+        # latency: how long the call took, credited to saved_seconds on every later hit
+        if not normalize(text):
+            return
+        namespace = self.namespace(model, template)
+        key = self.key(namespace, text)
+        vector = np.asarray(self.embed(normalize(text)), dtype=np.float32) if self.similarity is not None else None
+        with self.lock:
+            values = (response, None if vector is None else vector.tobytes(), latency, time.time(), self.tick())
+            with self.conn:
+                # Counting the inserted row keeps size without a COUNT(*) scan;
+                # a key that is already cached is overwritten in place
+                before = self.conn.total_changes
+                self.conn.execute('INSERT OR IGNORE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                  (key, namespace) + values)
+                added = self.conn.total_changes - before
+                if not added:
+                    self.conn.execute('''
+                        UPDATE responses SET response = ?, vector = ?, latency = ?, created = ?, last_used = ?
+                        WHERE key = ?
+                    ''', values + (key,))
+                self.size += added
+                if vector is not None:
+                    self.vectors.setdefault(namespace, {})[key] = vector
+                    self.matrices.pop(namespace, None)
+                if self.size > self.max_entries:
+                    evicted = [row[0] for row in self.conn.execute(
+                        'SELECT key FROM responses ORDER BY last_used LIMIT ?', (self.size - self.max_entries,))]
+                    self.counts["evicted"] += len(evicted)
+                    self._delete(evicted)
+
+    def delete(self, keys):
+        with self.conn:
+            self._delete(keys)
+
+    def _delete(self, keys):
+        # Runs inside the caller's transaction; size only drops by the rows actually removed
+        before = self.conn.total_changes
+        self.conn.executemany('DELETE FROM responses WHERE key = ?', ((key,) for key in keys))
+        self.size -= self.conn.total_changes - before
+        for namespace, vectors in self.vectors.items():
+            removed = [vectors.pop(key) for key in keys if key in vectors]
+            if removed:
+                self.matrices.pop(namespace, None)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counts["hits"] + self.counts["similar_hits"] + self.counts["misses"]
+            hit_rate = (self.counts["hits"] + self.counts["similar_hits"]) / lookups if lookups else 0.0
+            return dict(self.counts, entries=self.size, hit_rate=round(hit_rate, 3),
+                        saved_seconds=round(self.saved_seconds, 3))
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import re
+import faiss
+import numpy as np
+
+# Retrieval over a patient's history for rag.py. The record is split into:
+#   - core facts (profile, current prescriptions and conditions, next
+#     appointment): short and needed for most questions, so always sent
+#   - history chunks (visit summaries and emotional states, long summaries
+#     split into overlapping word windows), embedded on the CPU and searched
+#     with FAISS so only the top-k relevant ones go into the prompt
+# Prompt size then stays flat as visits accumulate instead of growing with them.
+
+def chunk_text(text, max_words=80, overlap=20):
+    # Overlapping word windows, so a fact near a boundary is whole in one of them
+    words = text.split()
+    if len(words) <= max_words:
+        return [" ".join(words)] if words else []
+    step = max_words - overlap
+    return [" ".join(words[start:start + max_words]) for start in range(0, len(words) - overlap, step)]
+
+def chunk_record(data, max_words=80):
+    chunks = []
+    for visit in data.get("appointments", []):
+        for text in chunk_text(visit.get("summary", ""), max_words):
+            chunks.append({"kind": "visit", "date": visit.get("date", ""), "text": f"Visit on {visit.get('date', '')}: {text}"})
+    for state in data.get("emotional_states", []):
+        if state.get("emotion"):
+            chunks.append({"kind": "emotional_state", "date": state.get("date", ""),
+                           "text": f"Emotional state on {state.get('date', '')}: {state['emotion']}"})
+    return chunks
+
+def core_facts(data):
+    user = data.get("user", {})
+    lines = [", ".join(f"{key}: {value}" for key, value in user.items() if value)]
+    for label, key in (("Prescriptions", "prescriptions"), ("Conditions", "conditions")):
+        values = [value for value in data.get(key, []) if value]
+        if values:
+            lines.append(f"{label}: {', '.join(values)}")
+    if data.get("next_appointment"):
+        lines.append(f"Next appointment: {data['next_appointment']}")
+    return "\n".join(lines)
+
+# Question words and record boilerplate ("Visit on ...", "the patient") that
+# would otherwise make every chunk look alike to the hashing embedder
+STOPWORDS = frozenset("""a an and are as at be by did does do for from had has have he her his how i in is it its
+of on or she that the their them they this to was were what when which who why will with patient patients visit
+visits""".split())
+
+class HashingEmbedder:
+    # Dependency-free lexical embedding: hashed word unigrams and bigrams (after
+    # dropping stopwords) with sublinear term frequency. Matches shared wording
+    # only, not paraphrases.
+    name = "hashing"
+
+    def __init__(self, dim=1024):
+        self.dim = dim
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = [word for word in re.findall(r"[a-z0-9']+", text.lower()) if word not in STOPWORDS]
+            for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                column = int.from_bytes(hashlib.blake2b(term.encode(), digest_size=4).digest(), "little") % self.dim
+                vectors[row, column] += 1.0
+        np.log1p(vectors, out=vectors)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+class SentenceEmbedder:
+    # A small sentence-transformers model on the CPU (all-MiniLM-L6-v2: 384
+    # dimensions, a few ms per chunk). Optional dependency, imported when built.
+    name = "minilm"
+
+    def __init__(self, model_name=None):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("The minilm embedder needs `pip install sentence-transformers`; "
+                              "set RAG_EMBEDDER=hashing to run without it") from e
+        self.model = SentenceTransformer(model_name or os.getenv("RAG_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
+                                         device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts):
+        return self.model.encode(list(texts), batch_size=64, normalize_embeddings=True,
+                                 convert_to_numpy=True).astype(np.float32)
+
+EMBEDDERS = {embedder.name: embedder for embedder in (SentenceEmbedder, HashingEmbedder)}
+
+def create_embedder(name=None, **kwargs):
+    # name defaults to $RAG_EMBEDDER, then "minilm"
+    name = name or os.getenv("RAG_EMBEDDER", "minilm")
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder {name}, expected one of {sorted(EMBEDDERS)}")
+    return EMBEDDERS[name](**kwargs)
+
+class HistoryIndex:
+    # Exact inner-product search over normalized vectors (cosine similarity).
+    # One patient's history is small enough that a flat index is the fastest.
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.index = faiss.IndexFlatIP(embedder.dim)
+        self.chunks = []
+
+    def add(self, chunks):
+        if not chunks:
+            return
+        self.index.add(self.embedder.encode([chunk["text"] for chunk in chunks]))
+        self.chunks.extend(chunks)
+
+    def search(self, question, k=5):
+        # [(chunk, score)], best first
+        if not self.chunks:
+            return []
+        scores, rows = self.index.search(self.embedder.encode([question]), min(k, len(self.chunks)))
+        return [(self.chunks[row], float(score)) for row, score in zip(rows[0], scores[0]) if row >= 0]
+
+class PatientHistory:
+    def __init__(self, data, embedder=None, k=5, max_words=80):
+        self.k = k
+        self.core = core_facts(data)
+        self.index = HistoryIndex(embedder or create_embedder())
+        self.index.add(chunk_record(data, max_words))
+
+    def context(self, question):
+        # Core facts plus the chunks most relevant to the question, in date order
+        chunks = sorted((chunk for chunk, _ in self.index.search(question, self.k)), key=lambda chunk: chunk["date"])
+        if not chunks:
+            return self.core
+        return self.core + "\n\nRelevant history:\n" + "\n".join(chunk["text"] for chunk in chunks)
@@ -0,0 +1,174 @@
+import re
+import threading
+import time
+from segmentpipeline import SegmentQueue, StageStats
+
+DIFF_LINE = re.compile(r"^\s*(?:([+])\s*(.+)|([~])\s*(\d+)[.:]?\s+(.+)|([-])\s*(\d+)\b.*)$")
+
+def apply_diff(notes, diff):
+    # Applies a '+ note' / '~ n note' / '- n' diff to the numbered notes.
+    # Numbers refer to the notes before the diff; lines that do not parse,
+    # or point at notes that do not exist, are ignored. Returns the new notes
+    # and the changes that were applied as (op, number or None, text).
+    notes = list(notes)
+    removed = set()
+    added = []
+    changes = []
+    for line in diff.splitlines():
+        match = DIFF_LINE.match(line)
+        if not match:
+            continue
+        if match.group(1):
+            added.append(match.group(2).strip())
+            changes.append(("+", None, added[-1]))
+            continue
+        number = int(match.group(4) or match.group(7))
+        if not 1 <= number <= len(notes) or number in removed:
+            continue
+        if match.group(3):
+            notes[number - 1] = match.group(5).strip()
+            changes.append(("~", number, notes[number - 1]))
+        else:
+            removed.add(number)
+            changes.append(("-", number, notes[number - 1]))
+    notes = [note for i, note in enumerate(notes, 1) if i not in removed] + added
+    return notes, changes
+
+class RollingSummarizer:
+    # Keeps a short list of running notes for the visit instead of summarizing
+    # every utterance in isolation. A request goes out as soon as an utterance
+    # arrives and none is in flight; utterances that arrive while one is in
+    # flight are batched into the next (up to max_batch). max_wait > 0 also
+    # holds a request back that long for more utterances, trading latency for
+    # fewer requests; keep it 0 when the notes are streamed to a display. Each request sends
+    # only the current notes plus the new transcript; the model answers with a
+    # diff. The notes are held to max_notes (see consolidate), so each update
+    # and the final summary cost about the same however long the visit runs.
+    # on_update(notes, changes, batch) is called after every update, in order.
+    # With on_delta set, the reply is streamed and on_delta(batch, text) called
+    # as it arrives, so a display can show notes while they are being written.
+    def __init__(self, groq_client, on_update=None, max_batch=4, max_wait=0.0, max_notes=30, queue_size=16):
+        self.groq_client = groq_client
+        self.on_update = on_update
+        self.on_delta = None
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_notes = max_notes
+        self.notes = []
+        self.lock = threading.Lock()
+        self.queue = SegmentQueue("summarize", queue_size)
+        self.stats = StageStats("summarize")
+        self.first_token = StageStats("first_token")
+        self.failures = 0
+        self.consolidations = 0
+        self.started_at = None
+
+    def add(self, segment):
+        # segment: a dict with the utterance "text"
+        self.queue.put(segment)
+
+    def next_batch(self):
+        segment = self.queue.get()
+        if segment is None:
+            return []
+        batch = [segment]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            # With no time left this still takes what queued up during the last request
+            segment = self.queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+            if segment is None:
+                break
+            batch.append(segment)
+        return batch
+
+    def run(self):
+        while not self.queue.drained():
+            batch = self.next_batch()
+            if batch:
+                self.update(batch)
+
+    def update(self, batch):
+        start = time.perf_counter()
+        with self.lock:
+            notes = list(self.notes)
+        transcript = " ".join(segment["text"] for segment in batch)
+        requested_at = time.time()  # Wall clock, for displays in other processes
+        for segment in batch:
+            segment["requested_at"] = requested_at
+        try:
+            if self.on_delta is None:
+                diff = self.groq_client.update_notes(notes, transcript, self.max_notes)
+            else:
+                received = False
+                def on_delta(text):
+                    nonlocal received
+                    if not received:
+                        received = True
+                        self.first_token.record(time.perf_counter() - start)
+                    self.on_delta(batch, text)
+                diff = self.groq_client.update_notes(notes, transcript, self.max_notes, on_delta=on_delta)
+        except Exception as e:
+            # The notes are kept as they were; this batch is missing from them
+            self.failures += 1
+            print(f"Summary update failed: {e}")
+            diff = ""
+        notes, changes = apply_diff(notes, diff)
+        if len(notes) > self.max_notes:
+            notes, merged = self.consolidate(notes)
+            changes += merged
+        with self.lock:
+            self.notes = notes
+        self.stats.record(time.perf_counter() - start)
+        if self.on_update:
+            self.on_update(notes, changes, batch)
+
+    def consolidate(self, notes):
+        # The model is asked to merge notes down to two thirds of max_notes, so this
+        # is not needed again on the next update. If that fails or leaves too many,
+        # the oldest notes are folded into the first one, so the cap always holds.
+        self.consolidations += 1
+        changes = []
+        try:
+            diff = self.groq_client.consolidate_notes(notes, max(1, self.max_notes * 2 // 3))
+            notes, changes = apply_diff(notes, diff)
+        except Exception as e:
+            self.failures += 1
+            print(f"Notes consolidation failed: {e}")
+        if len(notes) > self.max_notes:
+            overflow = len(notes) - self.max_notes + 1
+            merged = "; ".join(notes[:overflow])
+            changes += [("-", number, note) for number, note in enumerate(notes[1:overflow], 2)]
+            changes.append(("~", 1, merged))
+            notes = [merged] + notes[overflow:]
+        return notes, changes
+
+    def get_notes(self):
+        with self.lock:
+            return list(self.notes)
+
+    def final_summary(self):
+        # End-of-visit paragraph from the running notes, not the whole transcript
+        notes = self.get_notes()
+        if not notes:
+            return ""
+        return self.groq_client.summarize_bullets("\n".join(f"• {note}" for note in notes))
+
+    def metrics(self):
+        usage = self.groq_client.usage()
+        minutes = (time.perf_counter() - self.started_at) / 60 if self.started_at else 0.0
+        # Tokens sent per minute of visit is the cost metric rolling summarization is meant to keep flat
+        usage["prompt_tokens_per_minute"] = round(usage["prompt_tokens"] / minutes, 1) if minutes > 0 else 0.0
+        return {"tokens": usage, "notes": len(self.get_notes()), "failures": self.failures,
+                "consolidations": self.consolidations,
+                "batches": self.stats.summary(), "first_token": self.first_token.summary(),
+                "queue": self.queue.summary()}
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+
+    def stop(self):
+        # Summarizes what is still queued, then returns
+        self.queue.close()
+        self.thread.join()
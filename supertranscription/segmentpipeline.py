@@ -0,0 +1,120 @@
+import threading
+from collections import deque
+
+BACKPRESSURE_POLICIES = ("block", "drop", "merge")
+
+class StageStats:
+    def __init__(self, name, window=100):
+        self.name = name
+        self.latencies = deque(maxlen=window)
+        self.processed = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.processed += 1
+
+    def summary(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            processed = self.processed
+        avg_ms = 1000 * sum(latencies) / len(latencies) if latencies else 0.0
+        max_ms = 1000 * max(latencies) if latencies else 0.0
+        return {"stage": self.name, "processed": processed, "avg_ms": round(avg_ms, 2), "max_ms": round(max_ms, 2)}
+
+def merge_segments(target, segment):
+    # Appends segment to target. Text from a streaming recognizer is joined when
+    # both have it; otherwise it is dropped so the merged audio is transcribed again.
+    target["audio"] += segment["audio"]
+    if target.get("text") is not None and segment.get("text") is not None:
+        target["text"] = " ".join(text for text in (target["text"], segment["text"]) if text)
+    else:
+        target.pop("text", None)
+
+class SegmentQueue:
+    # Bounded hand-off between stages. When full, put() follows the policy:
+    #   block  wait for a worker to take something (audio keeps buffering upstream)
+    #   drop   discard the oldest queued segment; on_drop(segment) is called for it
+    #   merge  append the new segment to the newest queued one (merge_segments),
+    #          so one longer recognition call replaces two
+    def __init__(self, name, maxsize, policy="block", on_drop=None):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy {policy}, expected one of {BACKPRESSURE_POLICIES}")
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.on_drop = on_drop
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+        self.merged = 0
+        self.max_depth = 0
+
+    def put(self, segment):
+        dropped = None
+        with self.condition:
+            if len(self.items) >= self.maxsize:
+                if self.policy == "block":
+                    self.condition.wait_for(lambda: len(self.items) < self.maxsize or self.closed)
+                elif self.policy == "drop":
+                    dropped = self.items.popleft()
+                    self.dropped += 1
+                else:
+                    merge_segments(self.items[-1], segment)
+                    self.merged += 1
+                    return False
+            self.items.append(segment)
+            self.max_depth = max(self.max_depth, len(self.items))
+            self.condition.notify_all()
+        if dropped is not None and self.on_drop:
+            self.on_drop(dropped)
+        return True
+
+    def get(self, timeout=0.5):
+        # Returns None on timeout, or once the queue is closed and drained
+        with self.condition:
+            self.condition.wait_for(lambda: self.items or self.closed, timeout=timeout)
+            if not self.items:
+                return None
+            segment = self.items.popleft()
+            self.condition.notify_all()
+            return segment
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def drained(self):
+        with self.condition:
+            return self.closed and not self.items
+
+    def summary(self):
+        with self.condition:
+            return {"queue": self.name, "depth": len(self.items), "max_depth": self.max_depth,
+                    "dropped": self.dropped, "merged": self.merged}
+
+class ResultSequencer:
+    # Workers finish out of order; results are released strictly by sequence
+    # number. complete(seq, None) marks a segment that produced nothing
+    # (no speech recognized, or dropped) so later ones are not held back.
+    def __init__(self, emit):
+        self.emit = emit
+        self.next_seq = 0
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def complete(self, seq, result):
+        with self.lock:
+            self.results[seq] = result
+            while self.next_seq in self.results:
+                result = self.results.pop(self.next_seq)
+                self.next_seq += 1
+                if result is not None:
+                    self.emit(result)
+
+    def waiting(self):
+        with self.lock:
+            return len(self.results)
@@ -1,15 +1,15 @@
-import speech_recognition as sr
+import wave
+from asrbackends import create_backend
 
 class SpeechRecognizer:
-    def __init__(self):
-        self.recognizer = sr.Recognizer()
+    def __init__(self, backend=None):
+        # Any asrbackends backend; $ASR_BACKEND picks one when not given
+        self.backend = backend or create_backend()
 
-    def transcribe(self, audio_file):
-        with sr.AudioFile(audio_file) as source:
-            audio = self.recognizer.record(source)
-            try:
-                return self.recognizer.recognize_google(audio)
-            except sr.UnknownValueError:
-                return "Google Speech Recognition could not understand audio"
-            except sr.RequestError as e:
-                return f"Could not request results from Google Speech Recognition service; {e}"
\ No newline at end of file
+    def transcribe(self, audio):
+        # audio is an in-memory sr.AudioData or the path of a 16-bit mono WAV file.
+        # Returns "" when no speech was recognized; TranscriptionError propagates.
+        if isinstance(audio, str):
+            with wave.open(audio, 'rb') as wf:
+                return self.backend.transcribe(wf.readframes(wf.getnframes()), wf.getframerate())
+        return self.backend.transcribe(audio.get_raw_data(convert_width=2), audio.sample_rate)
@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+from groqclient import GroqClient
+from responsecache import ResponseCache
+
+class ScriptedLLM:
+    # Stands in for llmclient.LLMClient: replies with the next scripted content
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    def complete(self, **request):
+        self.requests.append(request)
+        message = SimpleNamespace(content=self.replies.pop(0))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+def test_filler_note_updates_are_answered_from_the_cache():
+    llm = ScriptedLLM(["", "+ Takes metformin", ""])
+    client = GroqClient(llm=llm, cache=ResponseCache(path=":memory:", similarity=0.9))
+    assert client.update_notes([], "Uh huh.") == ""
+    assert client.update_notes([], "uh-huh") == ""
+    assert client.update_notes([], "I take metformin every morning.") == "+ Takes metformin"
+    # Note changes are never cached, and new notes make a new template
+    assert client.update_notes(["Takes metformin"], "uh huh") == ""
+    assert len(llm.requests) == 3
+
+def test_bullet_summaries_are_cached_exactly():
+    llm = ScriptedLLM(["Paragraph one.", "Paragraph two."])
+    client = GroqClient(llm=llm, cache=ResponseCache(path=":memory:", similarity=0.5))
+    assert client.summarize_bullets("• Takes metformin 10 mg") == "Paragraph one."
+    assert client.summarize_bullets("• Takes metformin 10 mg") == "Paragraph one."
+    assert client.summarize_bullets("• Takes metformin 20 mg") == "Paragraph two."
@@ -0,0 +1,35 @@
+from responsecache import ResponseCache, normalize
+
+def test_normalize_keeps_non_latin_words():
+    assert normalize("¿Qué medicación toma?") == "qué medicación toma"
+    assert normalize("她在吃什么药？") == "她在吃什么药"
+    assert normalize("  What MEDICATION, is she on? ") == "what medication is she on"
+
+def test_non_latin_questions_get_their_own_keys():
+    cache = ResponseCache(path=":memory:")
+    cache.put("model", "template", "她在吃什么药", "Answer about medication")
+    assert cache.get("model", "template", "他有什么过敏") is None
+    assert cache.get("model", "template", "她在吃什么药？") == "Answer about medication"
+
+def test_inputs_without_words_are_not_cached():
+    cache = ResponseCache(path=":memory:")
+    cache.put("model", "template", "...", "Answer")
+    assert len(cache) == 0
+    assert cache.get("model", "template", "?!") is None
+    assert cache.stats()["skipped"] == 1
+
+def test_size_tracks_rows_through_overwrites_evictions_and_expiry():
+    cache = ResponseCache(path=":memory:", max_entries=5, similarity=0.9)
+    count = lambda: cache.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+    for i in range(12):
+        cache.put("model", "template", f"question {i % 8}", f"answer {i}")
+        assert len(cache) == count() == min(i + 1, 5)
+    assert cache.get("model", "template", "question 3") == "answer 11"
+    assert cache.get("model", "template", "question 5", similar=False) is None  # Least recently used, evicted
+    assert sorted(cache.vectors[cache.namespace("model", "template")]) == sorted(
+        row[0] for row in cache.conn.execute('SELECT key FROM responses'))
+    cache.ttl = -1
+    assert cache.get("model", "template", "question 3") is None
+    cache.delete([cache.key(cache.namespace("model", "template"), "question 3")])  # Already gone
+    assert len(cache) == count() == 4
+    assert cache.stats()["expired"] == 1
@@ -0,0 +1,55 @@
+import re
+from rollingsummarizer import RollingSummarizer, apply_diff
+
+class ScriptedClient:
+    # Adds every utterance of a batch as its own note; consolidation merges
+    # pairs of notes when cooperative, and changes nothing otherwise
+    def __init__(self, cooperative=True):
+        self.cooperative = cooperative
+        self.consolidate_calls = 0
+
+    def update_notes(self, notes, transcript, max_notes=30, on_delta=None):
+        return "\n".join(f"+ {text}" for text in re.findall(r"utterance \d+", transcript))
+
+    def consolidate_notes(self, notes, max_notes):
+        self.consolidate_calls += 1
+        if not self.cooperative:
+            return ""
+        lines = []
+        for number in range(1, len(notes), 2):
+            lines.append(f"~ {number} {notes[number - 1]}, {notes[number]}")
+            lines.append(f"- {number + 1}")
+        return "\n".join(lines)
+
+    def usage(self):
+        return {"prompt_tokens": 0}
+
+def run_visit(client, utterances=600, max_batch=4, max_notes=30):
+    summarizer = RollingSummarizer(client, max_batch=max_batch, max_notes=max_notes)
+    counts = []
+    for start in range(0, utterances, max_batch):
+        summarizer.update([{"text": f"utterance {i}."} for i in range(start, start + max_batch)])
+        counts.append(len(summarizer.get_notes()))
+    return summarizer, counts
+
+def test_apply_diff():
+    notes, changes = apply_diff(["a", "b", "c"], "+ d\n~ 1 A\n- 2\n- 9\nnot a diff")
+    assert notes == ["A", "c", "d"]
+    assert changes == [("+", None, "d"), ("~", 1, "A"), ("-", 2, "b")]
+
+def test_notes_stay_bounded_when_the_model_consolidates():
+    client = ScriptedClient()
+    summarizer, counts = run_visit(client)
+    assert max(counts) <= 30
+    assert client.consolidate_calls == summarizer.consolidations > 0
+    # Consolidation goes well below the cap, so it is not needed on every update
+    assert summarizer.consolidations < len(counts) / 2
+    # Nothing is lost, only merged
+    assert all(f"utterance {i}" in " ".join(summarizer.get_notes()) for i in range(600))
+
+def test_notes_stay_bounded_when_the_model_does_not():
+    client = ScriptedClient(cooperative=False)
+    summarizer, counts = run_visit(client)
+    assert max(counts) <= 30
+    assert counts[-1] == 30
+    assert "utterance 0" in summarizer.get_notes()[0]
@@ -0,0 +1,30 @@
+from segmentpipeline import SegmentQueue
+
+def test_merge_joins_streamed_text():
+    queue = SegmentQueue("transcribe", 1, "merge")
+    assert queue.put({"audio": b"aa", "text": "first utterance", "seq": 0})
+    assert not queue.put({"audio": b"bb", "text": "second utterance", "seq": 1})
+    segment = queue.get(timeout=0)
+    assert segment["audio"] == b"aabb"
+    assert segment["text"] == "first utterance second utterance"
+    assert queue.summary()["merged"] == 1
+
+def test_merge_skips_empty_text():
+    queue = SegmentQueue("transcribe", 1, "merge")
+    queue.put({"audio": b"aa", "text": "", "seq": 0})
+    queue.put({"audio": b"bb", "text": "second utterance", "seq": 1})
+    assert queue.get(timeout=0)["text"] == "second utterance"
+
+def test_merge_without_both_texts_transcribes_again():
+    # A failed streaming transcription (None) or an untranscribed segment means
+    # the merged audio has to go through recognition
+    for first, second in (("first utterance", None), (None, "second utterance")):
+        queue = SegmentQueue("transcribe", 1, "merge")
+        queue.put({"audio": b"aa", "text": first, "seq": 0})
+        queue.put({"audio": b"bb", "text": second, "seq": 1})
+        assert "text" not in queue.get(timeout=0)
+    queue = SegmentQueue("transcribe", 1, "merge")
+    queue.put({"audio": b"aa", "seq": 0})
+    queue.put({"audio": b"bb", "text": "second utterance", "seq": 1})
+    segment = queue.get(timeout=0)
+    assert segment["audio"] == b"aabb" and "text" not in segment
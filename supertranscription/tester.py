@@ -1,14 +1,14 @@
 import os
 import json
-import pyaudio
-import wave
-import speech_recognition as sr
 import threading
 import gspread
 from dotenv import load_dotenv
-from groq import Groq
 from oauth2client.service_account import ServiceAccountCredentials
 import time
+from audiorecorder import AudioRecorder
+from realtimeprocessor import RealTimeProcessor
+import groqclient
+from responsecache import ResponseCache
 
 load_dotenv()
 
@@ -58,362 +58,143 @@ def add_emotional_state(date, emotion):
         "emotion": emotion
     })
 
-class GroqClient:
-    def __init__(self):
-        self.client = Groq(api_key=os.getenv('GROQ_API_KEY'))
-        self.model = 'llama3-8b-8192'
-
-    def summarize(self, text):
-        messages = [
-            {"role": "system", "content": "You are a helpful medical assistant. You will be given transcription of a conversation between a doctor and a patient. Concisely summarize relevant information such as symptoms, prescriptions, appointment schedulings, etc. in a very short single bullet point. If there is no important medical information or transcript, you must respond with only '-'."},
-            {"role": "user", "content": text}
-        ]
-
-        response = self.client.chat.completions.create(
-            messages=messages,
-            model=self.model,
-            max_tokens=1024,
-            temperature=0.2,
-            top_p=1
-        )
-
-        return response.choices[0].message.content
-    
-    def summarize_bullets(self, text):
-        messages = [
-            {"role": "system", "content": "You are a helpful medical assistant. Summarize the given bullet points taken during a doctor's appointment into a single paragraph for the doctor to refer to later."},
-            {"role": "user", "content": text}
-        ]
-
-        response = self.client.chat.completions.create(
-            messages=messages,
-            model=self.model,
-            max_tokens=1024,
-            temperature=0.5,
-            top_p=1
-        )
-
-        return response.choices[0].message.content
-
-    def process_prescription(self, summary):
-        messages = [
-            {"role": "system", "content": "You are a multi-function calling LLM that helps with creating prescriptions based on a medical summary."},
-            {"role": "user", "content": summary}
-        ]
-        tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "create_prescription",
-                    "description": "Create a prescription with the given medication.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "medication": {
-                                "type": "string",
-                                "description": "The name of the medication."
-                            },
-                        },
-                        "required": ["medication"]
-                    }
-                }
+# Everything the end-of-visit request may record, offered in one request
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "create_prescription",
+            "description": "Create a prescription with the given medication.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "medication": {
+                        "type": "string",
+                        "description": "The name of the medication."
+                    },
+                },
+                "required": ["medication"]
             }
-        ]
-
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            tools=tools,
-            tool_choice="auto",
-            max_tokens=1024
-        )
-
-        response_message = response.choices[0].message
-        tool_calls = response_message.tool_calls
-
-        if tool_calls:
-            available_functions = {
-                "create_prescription": create_prescription
-            }
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_to_call = available_functions[function_name]
-                function_args = json.loads(tool_call.function.arguments)
-                function_response = function_to_call(**function_args)
-                print(json.loads(function_response)["message"])
-
-    def process_condition(self, summary):
-        messages = [
-            {"role": "system", "content": "You are a multi-function calling LLM that helps with adding conditions based on a medical summary."},
-            {"role": "user", "content": summary}
-        ]
-        tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "add_condition",
-                    "description": "Add a condition or symptom.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "condition": {
-                                "type": "string",
-                                "description": "The condition or symptom to be added."
-                            },
-                        },
-                        "required": ["condition"]
-                    }
-                }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "add_condition",
+            "description": "Add a medical condition the patient has.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "condition": {
+                        "type": "string",
+                        "description": "The name of the condition."
+                    },
+                },
+                "required": ["condition"]
             }
-        ]
-
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            tools=tools,
-            tool_choice="auto",
-            max_tokens=1024
-        )
-
-        response_message = response.choices[0].message
-        tool_calls = response_message.tool_calls
-
-        if tool_calls:
-            available_functions = {
-                "add_condition": add_condition
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "create_appointment",
+            "description": "Create an appointment with the given date.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "date": {
+                        "type": "string",
+                        "description": "The date of the appointment (e.g. '2023-06-30')."
+                    },
+                },
+                "required": ["date"]
             }
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_to_call = available_functions[function_name]
-                function_args = json.loads(tool_call.function.arguments)
-                function_response = function_to_call(**function_args)
-                print(json.loads(function_response)["message"])
-
-    def process_appointment(self, summary):
-        messages = [
-            {"role": "system", "content": "You are a multi-function calling LLM that helps with creating appointments based on a medical summary."},
-            {"role": "user", "content": summary}
-        ]
-        tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "create_appointment",
-                    "description": "Create an appointment with the given date.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "date": {
-                                "type": "string",
-                                "description": "The date of the appointment (e.g. '2023-06-30')."
-                            },
-                        },
-                        "required": ["date"]
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "add_visit_summary",
+            "description": "Add a visit summary for the given date.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "date": {
+                        "type": "string",
+                        "description": "The date of the visit (e.g. '2023-06-30')."
+                    },
+                    "summary": {
+                        "type": "string",
+                        "description": "The summary of the visit, as a single paragraph for the doctor to refer to later."
                     }
-                }
-            }
-        ]
-
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            tools=tools,
-            tool_choice="auto",
-            max_tokens=1024
-        )
-
-        response_message = response.choices[0].message
-        tool_calls = response_message.tool_calls
-
-        if tool_calls:
-            available_functions = {
-                "create_appointment": create_appointment
+                },
+                "required": ["date", "summary"]
             }
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_to_call = available_functions[function_name]
-                function_args = json.loads(tool_call.function.arguments)
-                function_response = function_to_call(**function_args)
-                print(json.loads(function_response)["message"])
+        }
+    }
+]
+
+TOOL_FUNCTIONS = {
+    "create_prescription": create_prescription,
+    "add_condition": add_condition,
+    "create_appointment": create_appointment,
+    "add_visit_summary": add_visit_summary
+}
 
-    def process_visit_summary(self, summary, date):
+def dispatch_tool_calls(calls):
+    # calls: (name, arguments) pairs, all from one response. Repeats are run
+    # once, and unknown tools or arguments are reported instead of raising
+    # halfway through the batch.
+    seen = set()
+    for name, args in calls:
+        key = (name, json.dumps(args, sort_keys=True))
+        if key in seen:
+            continue
+        seen.add(key)
+        try:
+            function_response = TOOL_FUNCTIONS[name](**args)
+        except (KeyError, TypeError) as e:
+            print(f"Skipping tool call {name}({args}): {e!r}")
+            continue
+        print(json.loads(function_response)["message"])
+
+class GroqClient(groqclient.GroqClient):
+    # Adds the end-of-visit request that records into db and the Google sheet
+
+    def process_visit(self, notes, date):
+        # One request replaces the paragraph summary and the four single-tool
+        # requests that used to run one after another. Returns the tool calls
+        # as (name, arguments) pairs; nothing is dispatched here.
         messages = [
-            {"role": "system", "content": "You are a multi-function calling LLM that helps with adding visit summaries based on a medical summary."},
-            {"role": "user", "content": summary}
-        ]
-        tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "add_visit_summary",
-                    "description": "Add a visit summary for the given date.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "date": {
-                                "type": "string",
-                                "description": "The date of the visit (e.g. '2023-06-30')."
-                            },
-                            "summary": {
-                                "type": "string",
-                                "description": "The summary of the visit."
-                            }
-                        },
-                        "required": ["date", "summary"]
-                    }
-                }
-            }
+            {"role": "system", "content": "You are a multi-function calling LLM that records the outcome of a doctor's appointment from the notes taken during it. Call add_visit_summary exactly once with a single-paragraph summary of the visit. Also call create_prescription for every medication prescribed, add_condition for every condition diagnosed, and create_appointment if a next appointment was scheduled."},
+            {"role": "user", "content": f"Visit date: {date}\n\nNotes:\n{notes}"}
         ]
 
-        response = self.client.chat.completions.create(
+        response = self.llm.complete(
             model=self.model,
             messages=messages,
-            tools=tools,
+            tools=TOOLS,
             tool_choice="auto",
             max_tokens=1024
         )
+        self.record_usage(response)
 
-        response_message = response.choices[0].message
-        tool_calls = response_message.tool_calls
-
-        if tool_calls:
-            available_functions = {
-                "add_visit_summary": add_visit_summary
-            }
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_to_call = available_functions[function_name]
-                function_args = json.loads(tool_call.function.arguments)
-                function_response = function_to_call(**function_args)
-                print(json.loads(function_response)["message"])
-
-class AudioRecorder:
-    def __init__(self):
-        self.chunk = 1024
-        self.sample_format = pyaudio.paInt16
-        self.channels = 1
-        self.rate = 44100
-        self.p = pyaudio.PyAudio()
-        self.stream = self.p.open(format=self.sample_format,
-                                  channels=self.channels,
-                                  rate=self.rate,
-                                  frames_per_buffer=self.chunk,
-                                  input=True)
-        self.frames = []
-        self.is_recording = False
-        self.lock = threading.Lock()
-
-    def start_recording(self):
-        self.is_recording = True
-        self.frames = []
-        while self.is_recording:
-            data = self.stream.read(self.chunk)
-            with self.lock:
-                self.frames.append(data)
-
-    def get_chunk(self):
-        with self.lock:
-            chunk = b''.join(self.frames)
-            self.frames = []
-        return chunk
-
-    def stop_recording(self):
-        self.is_recording = False
-        self.stream.stop_stream()
-
-    def terminate(self):
-        self.stream.close()
-        self.p.terminate()
-
-class SpeechRecognizer:
-    def __init__(self):
-        self.recognizer = sr.Recognizer()
-
-    def transcribe(self, audio_file):
-        with sr.AudioFile(audio_file) as source:
-            audio = self.recognizer.record(source)
-            try:
-                return self.recognizer.recognize_google(audio)
-            except sr.UnknownValueError:
-                return "Google Speech Recognition could not understand audio"
-            except sr.RequestError as e:
-                return f"Could not request results from Google Speech Recognition service; {e}"
-
-class TranscriptManager:
-    def __init__(self):
-        self.transcript = ""
-
-    def add_to_transcript(self, text):
-        self.transcript += text + " "
-
-    def get_transcript(self):
-        return self.transcript
-
-    def save_transcript(self, filename="transcript.txt"):
-        with open(filename, "w") as f:
-            f.write(self.transcript)
-
-    def load_transcript(self, filename="transcript.txt"):
-        with open(filename, "r") as f:
-            self.transcript = f.read()
-
-class RealTimeProcessor:
-    def __init__(self, audio_recorder, groq_client):
-        self.audio_recorder = audio_recorder
-        self.speech_recognizer = sr.Recognizer()
-        self.groq_client = groq_client
-        self.running = False
-        self.transcript_manager = TranscriptManager()
-
-    def process_audio(self):
-        while self.running:
-            chunk = self.audio_recorder.get_chunk()
-            if chunk:
-                audio_file = self.save_chunk_to_file(chunk)
-                text = self.transcribe_audio(audio_file)
-                if text:
-                    summary = self.groq_client.summarize(text)
-                    self.append_to_file(summary)
-                    self.transcript_manager.add_to_transcript(text)
-            time.sleep(3)  # Process every 3 seconds
-
-    def save_chunk_to_file(self, chunk):
-        filename = 'temp_chunk.wav'
-        with wave.open(filename, 'wb') as wf:
-            wf.setnchannels(self.audio_recorder.channels)
-            wf.setsampwidth(self.audio_recorder.p.get_sample_size(self.audio_recorder.sample_format))
-            wf.setframerate(self.audio_recorder.rate)
-            wf.writeframes(chunk)
-        return filename
-
-    def transcribe_audio(self, audio_file):
-        with sr.AudioFile(audio_file) as source:
-            audio = self.speech_recognizer.record(source)
+        calls = []
+        for tool_call in response.choices[0].message.tool_calls or []:
             try:
-                return self.speech_recognizer.recognize_google(audio)
-            except sr.UnknownValueError:
-                return None
-            except sr.RequestError as e:
-                return None
-
-    def append_to_file(self, summary):
-        with open("summary.txt", "a") as f:
-            f.write(f"• {summary}\n")
-
-    def start(self):
-        self.running = True
-        self.thread = threading.Thread(target=self.process_audio)
-        self.thread.start()
-
-    def stop(self):
-        self.running = False
-        self.thread.join()
+                calls.append((tool_call.function.name, json.loads(tool_call.function.arguments)))
+            except json.JSONDecodeError:
+                print(f"Skipping tool call {tool_call.function.name} with malformed arguments")
+        return calls
 
 class Listener:
     def __init__(self):
         self.audio_recorder = AudioRecorder()
-        self.groq_client = GroqClient()
-        self.real_time_processor = RealTimeProcessor(self.audio_recorder, self.groq_client)
+        # Filler that produced no note changes is answered from the cache (see GroqClient.update_notes)
+        self.groq_client = GroqClient(cache=ResponseCache(similarity=0.9))
+        # Set AUDIO_DEBUG_DIR to keep a WAV of every transcribed chunk
+        self.real_time_processor = RealTimeProcessor(self.audio_recorder, self.groq_client,
+                                                     debug_dir=os.getenv("AUDIO_DEBUG_DIR"))
         self.recording_thread = threading.Thread(target=self.audio_recorder.start_recording)
 
     def start(self):
@@ -431,25 +212,23 @@ class Listener:
         transcript = self.real_time_processor.transcript_manager.get_transcript()
         print("Transcript:", transcript)
 
-        print("Summarizing the conversation into a paragraph...")
-        paragraph_summary = self.groq_client.summarize_bullets(transcript)
-        print("Paragraph Summary:", paragraph_summary)
-
-        # Adding visit summary to database
         visit_date = time.strftime("%Y-%m-%d")
-        add_visit_summary(visit_date, paragraph_summary)
-
-        print("Processing summary to create prescriptions...")
-        self.groq_client.process_prescription(paragraph_summary)
-
-        print("Processing summary to add conditions...")
-        self.groq_client.process_condition(paragraph_summary)
-
-        print("Processing summary to schedule the next appointment...")
-        self.groq_client.process_appointment(paragraph_summary)
-
-        print("Processing summary to add visit summary...")
-        self.groq_client.process_visit_summary(paragraph_summary, visit_date)
+        notes = "\n".join(f"• {note}" for note in self.real_time_processor.summarizer.get_notes())
+        print("Recording the visit...")
+        start = time.perf_counter()
+        calls = self.groq_client.process_visit(notes, visit_date)
+        summaries = [args for name, args in calls if name == "add_visit_summary"]
+        if summaries:
+            paragraph_summary = summaries[0].get("summary")
+            calls = [call for call in calls if call[0] != "add_visit_summary"] + [("add_visit_summary", summaries[0])]
+        else:
+            # The model skipped it; fall back to a separate summary request
+            paragraph_summary = self.groq_client.summarize_bullets(notes) if notes else ""
+            calls.append(("add_visit_summary", {"date": visit_date, "summary": paragraph_summary}))
+        print("Paragraph Summary:", paragraph_summary)
+        self.real_time_processor.write_summary(self.real_time_processor.summarizer.get_notes(), paragraph_summary)
+        dispatch_tool_calls(calls)
+        print(f"Visit recorded in {time.perf_counter() - start:.2f}s")
 
         self.audio_recorder.terminate()
         print("Summary saved to summary.txt")
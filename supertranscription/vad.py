@@ -0,0 +1,108 @@
+import numpy as np
+
+class VoiceActivityDetector:
+    # Energy / zero-crossing voice activity detection over a stream of int16
+    # samples. Audio is classified in frame_ms frames: a frame is speech when
+    # its RMS energy is well above the running noise floor and its
+    # zero-crossing rate is below max_zcr (broadband hiss crosses zero far
+    # more often than voiced speech). feed() returns finished utterances as
+    # (start, end) absolute sample positions:
+    #   - an utterance starts once min_speech_ms of speech frames have been seen
+    #   - it ends after silence_ms without speech, or at max_seconds
+    #   - padding_ms of audio is kept on both sides so words are not clipped
+    # Stretches without enough speech are never returned.
+    def __init__(self, rate, frame_ms=30, padding_ms=300, silence_ms=600, max_seconds=15.0,
+                 min_speech_ms=150, energy_ratio=3.0, min_energy=200.0, max_zcr=0.3):
+        self.rate = rate
+        self.frame = int(rate * frame_ms / 1000)
+        self.padding = int(rate * padding_ms / 1000)
+        self.silence_frames = max(1, silence_ms // frame_ms)
+        self.max_samples = int(rate * max_seconds)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.energy_ratio = energy_ratio
+        self.min_energy = min_energy
+        self.max_zcr = max_zcr
+        self.noise_floor = min_energy
+        self.pending = np.empty(0, dtype=np.int16)
+        self.position = None  # Absolute position of the next frame to classify
+        self.reset_segment()
+
+    def reset_segment(self):
+        self.segment_start = None  # First speech frame of the current utterance
+        self.last_speech_end = None
+        self.speech_run = 0
+        self.pad_start = True  # False when continuing an utterance split at max_seconds
+
+    def is_speech(self, frames):
+        # frames: (n, frame) int16; returns one bool per frame
+        samples = frames.astype(np.float32)
+        energy = np.sqrt(np.mean(samples * samples, axis=1))
+        zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+        speech = np.empty(len(frames), dtype=bool)
+        for i in range(len(frames)):
+            speech[i] = energy[i] > max(self.min_energy, self.energy_ratio * self.noise_floor) and zcr[i] < self.max_zcr
+            if not speech[i]:
+                # The floor drops quickly in quiet and rises slowly, so a burst of
+                # loud non-speech (hiss, a door) does not mask the speech after it
+                rate = 0.3 if energy[i] < self.noise_floor else 0.01
+                self.noise_floor += rate * (max(energy[i], 1.0) - self.noise_floor)
+        return speech
+
+    def feed(self, samples, position):
+        # samples: int16 array (or buffer) starting at absolute sample position
+        samples = np.frombuffer(samples, dtype=np.int16)
+        if self.position is None or position != self.position + len(self.pending):
+            # First call, or a gap in the stream (e.g. a ring buffer overrun)
+            segments = self.flush()
+            self.pending = samples[:0]
+            self.position = position
+        else:
+            segments = []
+        data = np.concatenate([self.pending, samples]) if len(self.pending) else samples
+        count = len(data) // self.frame
+        speech = self.is_speech(data[:count * self.frame].reshape(count, self.frame)) if count else []
+        # Only the sub-frame remainder is copied; it is at most one frame long
+        self.pending = data[count * self.frame:].copy()
+
+        for is_speech in speech:
+            frame_start = self.position
+            self.position += self.frame
+            if is_speech:
+                self.speech_run += 1
+                if self.segment_start is None and self.speech_run >= self.min_speech_frames:
+                    self.segment_start = frame_start - (self.speech_run - 1) * self.frame
+                self.last_speech_end = self.position
+            else:
+                self.speech_run = 0
+            if self.segment_start is None:
+                continue
+            silent_for = (self.position - self.last_speech_end) // self.frame
+            if silent_for >= self.silence_frames:
+                segments.append(self.close_segment())
+            elif self.position - self.segment_start >= self.max_samples:
+                # Still talking: cut here and carry on in a new segment without padding
+                # at the cut, so no audio is lost or sent twice
+                segments.append((max(0, self.segment_start - (self.padding if self.pad_start else 0)), self.position))
+                self.segment_start = self.position
+                self.last_speech_end = self.position
+                self.pad_start = False
+        return segments
+
+    def close_segment(self):
+        start = self.segment_start - (self.padding if self.pad_start else 0)
+        end = min(self.position, self.last_speech_end + self.padding)
+        self.reset_segment()
+        return max(0, start), end
+
+    def active_start(self):
+        # Padded start of the utterance in progress, or None outside speech
+        if self.segment_start is None:
+            return None
+        return max(0, self.segment_start - (self.padding if self.pad_start else 0))
+
+    def flush(self):
+        # Ends the current utterance early, e.g. when recording stops
+        if self.segment_start is None:
+            self.reset_segment()
+            return []
+        return [self.close_segment()]